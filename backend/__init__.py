@@ -1 +1,9 @@
+"""WriteDarker backend."""
 
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# The one place environment variables are loaded from the repository's .env;
+# every ``backend`` module is imported after this runs.
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -1,8 +1,16 @@
 """Minimal AI-related endpoints."""
 
+import json
+import logging
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from ..services import ai
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -24,10 +32,39 @@ async def ai_root():
 
 @router.post("/mcp", response_model=MCPReply)
 async def mcp_reply(prompt: Prompt) -> MCPReply:
-    """Return a mocked MCP-style response for the given prompt."""
+    """Return the AI backend's reply to the prompt in one piece."""
+
+    return MCPReply(response=await ai.get_backend().complete(prompt.prompt))
+
+
+def _event(data: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/mcp/stream")
+async def mcp_stream(prompt: Prompt) -> StreamingResponse:
+    """Stream the reply as server-sent events while the backend generates it.
+
+    Every chunk is sent as ``data: {"token": ...}``; the stream ends with an
+    ``event: done`` carrying the full ``response``, or ``event: error``.
+    """
+
+    async def events():
+        tokens = []
+        try:
+            async for token in ai.get_backend().stream(prompt.prompt):
+                tokens.append(token)
+                yield _event({"token": token})
+        except Exception:
+            logger.exception("AI backend failed while streaming")
+            yield _event({"detail": "AI backend failed"}, "error")
+            return
+        yield _event({"response": "".join(tokens)}, "done")
 
-    text = prompt.prompt.strip()
-    if not text:
-        text = "..."
-    # Placeholder logic - eventually this will call an external AI service
-    return MCPReply(response=f"MCP mock reply: {text}")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass chunks on as they come instead of buffering them.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,40 +1,67 @@
 """API endpoints for document management."""
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
-from diff_match_patch import diff_match_patch
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 from typing import Optional, List
-from PyPDF2 import PdfReader
-import io
-import os
+import hashlib
 
 from .. import schemas, models
-from ..services import auth
-from .users import get_db, get_current_user
+from ..db import SessionLocal
+from ..services import auth, blobs, pdf_text, revisions
+from . import etag
+from .users import get_async_db, get_async_read_db, get_current_user_async
 
 router = APIRouter()
 
+# Column projections; hash/size bookkeeping and (for summaries) the text body
+# are never loaded unless a handler needs them.
+READ_COLUMNS = load_only(
+    models.Document.id,
+    models.Document.text,
+    models.Document.label,
+    models.Document.description,
+    models.Document.notes,
+    models.Document.project_id,
+    models.Document.position,
+    models.Document.extraction_status,
+    models.Document.version,
+)
+SUMMARY_COLUMNS = load_only(
+    models.Document.id,
+    models.Document.label,
+    models.Document.description,
+    models.Document.project_id,
+    models.Document.position,
+)
+ID_ONLY = load_only(models.Document.id)
 
-def _add_revision(db: Session, doc: models.Document):
-    """Store the current text of a document as a revision and enforce history limit."""
-    rev = models.DocumentRevision(document_id=doc.id, text=doc.text)
-    db.add(rev)
-    db.commit()
-    limit = int(os.getenv("DOC_HISTORY_LIMIT", "20"))
-    q = (
-        db.query(models.DocumentRevision)
-        .filter(models.DocumentRevision.document_id == doc.id)
-        .order_by(models.DocumentRevision.created_at.desc())
+
+def text_checksum(text: Optional[str]) -> str:
+    """Return the SHA-256 hex digest clients use to verify their copy of the text."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+async def _get_owned_document(db: AsyncSession, doc_id: int, user: models.User, columns=READ_COLUMNS):
+    """Return a document of ``user`` loading only ``columns`` or raise 404."""
+    doc = await db.scalar(
+        select(models.Document)
+        .options(columns)
+        .where(models.Document.id == doc_id, models.Document.creator_id == user.id)
     )
-    revisions = q.all()
-    if len(revisions) > limit:
-        for r in revisions[limit:]:
-            db.delete(r)
-        db.commit()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc
+
+
+def _submit_extraction(doc_id: int, pdf_hash: str, version: int):
+    pdf_text.submit(doc_id, pdf_hash, version, str(blobs.store.path(pdf_hash)), SessionLocal)
 
 
 @router.post("/", response_model=schemas.DocumentRead)
-def create_document(
+async def create_document(
     token: str,
     text: Optional[str] = None,
     pdf: Optional[UploadFile] = File(None),
@@ -44,31 +71,26 @@ def create_document(
     notes: Optional[str] = None,
     project_id: Optional[int] = None,
     position: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a new document owned by the current user."""
 
-    user = get_current_user(token, db)
+    user = await get_current_user_async(token, db)
 
-    pdf_bytes = None
-    extracted_text = text
+    pdf_hash = pdf_size = None
     if pdf is not None:
-        content = pdf.file.read()
-        pdf_bytes = content
-        try:
-            reader = PdfReader(io.BytesIO(content))
-            extracted_text = "\n".join(page.extract_text() or "" for page in reader.pages)
-        except Exception:
-            pass
-
-    image_bytes = None
+        pdf_hash, pdf_size = await run_in_threadpool(blobs.store.put, pdf.file)
+
+    image_hash = image_size = None
     if image is not None:
-        image_bytes = image.file.read()
+        image_hash, image_size = await run_in_threadpool(blobs.store.put, image.file)
 
     doc = models.Document(
-        text=extracted_text,
-        pdf=pdf_bytes,
-        image=image_bytes,
+        text=text,
+        pdf_hash=pdf_hash,
+        pdf_size=pdf_size,
+        image_hash=image_hash,
+        image_size=image_size,
         label=label,
         description=description,
         notes=notes,
@@ -76,42 +98,65 @@ def create_document(
         position=position or 0,
         creator_id=user.id,
     )
+    extract = pdf_hash is not None and not await db.run_sync(pdf_text.apply_cached_text, doc)
     db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    await db.commit()
+    await db.refresh(doc)
+    if extract:
+        _submit_extraction(doc.id, pdf_hash, doc.version)
     return doc
 
 
 @router.get("/{doc_id}", response_model=schemas.DocumentRead)
-def read_document(doc_id: int, token: str, db: Session = Depends(get_db)):
-    """Return a single document owned by the user."""
+async def read_document(
+    doc_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Return a single document owned by the user.
 
-    user = get_current_user(token, db)
-    doc = db.query(models.Document).filter(models.Document.id == doc_id, models.Document.creator_id == user.id).first()
-    if not doc:
+    Answers 304 if ``If-None-Match`` matches the document's current ETag.
+    """
+
+    user = await get_current_user_async(token, db)
+    stamp = (
+        await db.execute(
+            select(models.Document.version, models.Document.updated_at)
+            .where(models.Document.id == doc_id, models.Document.creator_id == user.id)
+        )
+    ).first()
+    if not stamp:
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc
+    cached = etag.check(request, response, etag.make_etag("document", doc_id, tuple(stamp)))
+    if cached:
+        return cached
+    return await _get_owned_document(db, doc_id, user)
+
+
+@router.get("/{doc_id}/extraction", response_model=schemas.ExtractionStatus)
+async def read_extraction_status(doc_id: int, token: str, db: AsyncSession = Depends(get_async_read_db)):
+    """Return the PDF text extraction status of a document."""
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user, load_only(models.Document.extraction_status))
+    return schemas.ExtractionStatus(document_id=doc.id, status=doc.extraction_status)
 
 
 @router.put("/{doc_id}", response_model=schemas.DocumentRead)
-def update_document(
+async def update_document(
     doc_id: int,
     update: schemas.DocumentUpdate,
     token: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Update an existing document."""
-    user = get_current_user(token, db)
-    doc = (
-        db.query(models.Document)
-        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
-        .first()
-    )
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user)
     if update.text is not None and update.text != doc.text:
-        _add_revision(db, doc)
+        await db.run_sync(revisions.add_revision, doc, author_id=user.id)
         doc.text = update.text
+        doc.version += 1
     if update.label is not None:
         doc.label = update.label
     if update.description is not None:
@@ -122,129 +167,183 @@ def update_document(
         doc.project_id = update.project_id
     if update.position is not None:
         doc.position = update.position
-    db.commit()
-    db.refresh(doc)
+    await db.commit()
+    await db.refresh(doc)
     return doc
 
 
-@router.patch("/{doc_id}", response_model=schemas.DocumentRead)
-def patch_document(doc_id: int, patch: str, token: str, db: Session = Depends(get_db)):
-    """Apply a diff/patch string to a document."""
-    user = get_current_user(token, db)
-    doc = (
-        db.query(models.Document)
-        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
-        .first()
+def _version_conflict(version: int):
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": "Version conflict", "version": version},
     )
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
+
+
+@router.patch("/{doc_id}", response_model=schemas.DocumentPatchResult)
+async def patch_document(
+    doc_id: int,
+    patch: schemas.DocumentPatch,
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Apply a diff_match_patch patch made against ``base_version`` of the text.
+
+    The patch is rejected with 409 if the document has moved past
+    ``base_version`` or if any hunk fails to apply. Only the new version and a
+    SHA-256 checksum of the resulting text are returned.
+    """
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user)
+    if doc.version != patch.base_version:
+        _version_conflict(doc.version)
+    from diff_match_patch import diff_match_patch
+
     dmp = diff_match_patch()
-    patches = dmp.patch_fromText(patch)
-    new_text, _ = dmp.patch_apply(patches, doc.text or "")
-    if new_text != doc.text:
-        _add_revision(db, doc)
-        doc.text = new_text
-        db.commit()
-        db.refresh(doc)
-    return doc
+    try:
+        patches = dmp.patch_fromText(patch.patch)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Malformed patch")
+    new_text, applied = dmp.patch_apply(patches, doc.text or "")
+    if not all(applied):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Patch does not apply", "version": doc.version},
+        )
+    version = doc.version
+    if new_text != (doc.text or ""):
+        await db.run_sync(revisions.add_revision, doc, author_id=user.id)
+        # Compare-and-swap so a concurrent save of the same base version loses.
+        result = await db.execute(
+            update(models.Document)
+            .where(models.Document.id == doc.id, models.Document.version == patch.base_version)
+            .values(text=new_text, version=patch.base_version + 1),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount != 1:
+            await db.rollback()
+            _version_conflict((await db.get(models.Document, doc_id)).version)
+        await db.commit()
+        version = patch.base_version + 1
+    return schemas.DocumentPatchResult(id=doc_id, version=version, checksum=text_checksum(new_text))
 
 
 @router.post("/{doc_id}/pdf", response_model=schemas.DocumentRead)
-def upload_pdf(doc_id: int, token: str, pdf: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Attach or replace a PDF for a document."""
-    user = get_current_user(token, db)
-    doc = db.query(models.Document).filter(models.Document.id == doc_id, models.Document.creator_id == user.id).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    doc.pdf = pdf.file.read()
-    db.commit()
-    db.refresh(doc)
+async def upload_pdf(doc_id: int, token: str, pdf: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    """Attach or replace a PDF for a document and re-extract its text.
+
+    The previous text is kept as a revision.
+    """
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user)
+    pdf_hash, pdf_size = await run_in_threadpool(blobs.store.put, pdf.file)
+    if doc.text:
+        await db.run_sync(revisions.add_revision, doc, author_id=user.id, coalesce=False)
+    doc.pdf_hash, doc.pdf_size = pdf_hash, pdf_size
+    extract = not await db.run_sync(pdf_text.apply_cached_text, doc)
+    await db.commit()
+    await db.refresh(doc)
+    if extract:
+        _submit_extraction(doc.id, pdf_hash, doc.version)
     return doc
 
 
 @router.post("/{doc_id}/image", response_model=schemas.DocumentRead)
-def upload_image(doc_id: int, token: str, image: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_image(doc_id: int, token: str, image: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     """Attach or replace an image for a document."""
-    user = get_current_user(token, db)
-    doc = db.query(models.Document).filter(models.Document.id == doc_id, models.Document.creator_id == user.id).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    doc.image = image.file.read()
-    db.commit()
-    db.refresh(doc)
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user)
+    doc.image_hash, doc.image_size = await run_in_threadpool(blobs.store.put, image.file)
+    await db.commit()
+    await db.refresh(doc)
     return doc
 
 
 @router.get("/{doc_id}/revisions", response_model=List[schemas.DocumentRevisionRead])
-def list_revisions(doc_id: int, token: str, db: Session = Depends(get_db)):
+async def list_revisions(doc_id: int, token: str, db: AsyncSession = Depends(get_async_read_db)):
     """Return revision history for a document."""
-    user = get_current_user(token, db)
-    doc = (
-        db.query(models.Document)
-        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
-        .first()
-    )
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    revs = (
-        db.query(models.DocumentRevision)
-        .filter(models.DocumentRevision.document_id == doc_id)
-        .order_by(models.DocumentRevision.created_at)
-        .all()
-    )
-    return revs
+    user = await get_current_user_async(token, db)
+    await _get_owned_document(db, doc_id, user, ID_ONLY)
+    return await db.run_sync(revisions.list_revisions, doc_id)
 
 
 @router.post("/{doc_id}/restore/{rev_id}", response_model=schemas.DocumentRead)
-def restore_revision(doc_id: int, rev_id: int, token: str, db: Session = Depends(get_db)):
+async def restore_revision(doc_id: int, rev_id: int, token: str, db: AsyncSession = Depends(get_async_db)):
     """Restore a document to a previous revision."""
-    user = get_current_user(token, db)
-    doc = (
-        db.query(models.Document)
-        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
-        .first()
-    )
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    rev = (
-        db.query(models.DocumentRevision)
-        .filter(models.DocumentRevision.id == rev_id, models.DocumentRevision.document_id == doc_id)
-        .first()
-    )
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user)
+    rev = await db.run_sync(revisions.get_revision, doc_id, rev_id)
     if not rev:
         raise HTTPException(status_code=404, detail="Revision not found")
     if rev.text != doc.text:
-        _add_revision(db, doc)
+        await db.run_sync(revisions.add_revision, doc, author_id=user.id, coalesce=False)
         doc.text = rev.text
-        db.commit()
-        db.refresh(doc)
+        doc.version += 1
+        await db.commit()
+        await db.refresh(doc)
     return doc
 
 
 @router.delete("/{doc_id}")
-def delete_document(doc_id: int, token: str, db: Session = Depends(get_db)):
+async def delete_document(doc_id: int, token: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a document owned by the current user."""
 
-    user = get_current_user(token, db)
-    doc = db.query(models.Document).filter(models.Document.id == doc_id, models.Document.creator_id == user.id).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    db.delete(doc)
-    db.commit()
+    user = await get_current_user_async(token, db)
+    doc = await _get_owned_document(db, doc_id, user, ID_ONLY)
+    await db.delete(doc)
+    await db.commit()
     return {"message": "deleted"}
 
 
 @router.get("/project/{project_id}", response_model=List[schemas.DocumentRead])
-def list_project_documents(project_id: int, token: str, db: Session = Depends(get_db)):
+async def list_project_documents(
+    project_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """List documents belonging to a project ordered by position."""
-    user = get_current_user(token, db)
-    docs = (
-        db.query(models.Document)
-        .filter(
+    user = await get_current_user_async(token, db)
+    cached = await _check_project_etag(db, project_id, user, "documents", request, response)
+    if cached:
+        return cached
+    return (await db.scalars(_project_documents(project_id, user).options(READ_COLUMNS))).all()
+
+
+@router.get("/project/{project_id}/summary", response_model=List[schemas.DocumentSummary])
+async def list_project_document_summaries(
+    project_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """List documents of a project without their text, e.g. for a sidebar."""
+    user = await get_current_user_async(token, db)
+    cached = await _check_project_etag(db, project_id, user, "summaries", request, response)
+    if cached:
+        return cached
+    return (await db.scalars(_project_documents(project_id, user).options(SUMMARY_COLUMNS))).all()
+
+
+def _project_documents(project_id: int, user: models.User):
+    return (
+        select(models.Document)
+        .where(
             models.Document.project_id == project_id,
             models.Document.creator_id == user.id,
         )
         .order_by(models.Document.position)
-        .all()
     )
-    return docs
+
+
+async def _check_project_etag(db, project_id, user, kind, request, response):
+    stamps = (
+        await db.execute(
+            _project_documents(project_id, user).with_only_columns(
+                models.Document.id, models.Document.version, models.Document.updated_at
+            )
+        )
+    ).all()
+    tag = etag.make_etag(kind, project_id, [tuple(row) for row in stamps])
+    return etag.check(request, response, tag)
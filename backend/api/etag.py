@@ -0,0 +1,40 @@
+"""Conditional GET support for read endpoints.
+
+Handlers compute a weak ETag from cheap version columns (``version``,
+``updated_at``, ids) before loading or serializing the payload, and answer
+``304 Not Modified`` when the client already holds that version.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Responses are per user (token-scoped) and must be revalidated on every use.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Return a weak ETag hashing the ``repr`` of ``parts`` (ids, versions, rows)."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def check(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set caching headers and return a 304 response if ``etag`` is current."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,18 +1,30 @@
 """API endpoints for project CRUD operations."""
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import schemas, models
-from .users import get_db, get_current_user
+from ..services import bibliography
+from . import etag
+from .users import get_async_db, get_async_read_db, get_current_user_async
 
 router = APIRouter()
 
 
+async def _get_owned_project(db: AsyncSession, project_id: int, user: models.User) -> models.Project:
+    proj = await db.scalar(
+        select(models.Project).where(models.Project.id == project_id, models.Project.author_id == user.id)
+    )
+    if not proj:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return proj
+
+
 @router.post("/", response_model=schemas.ProjectRead)
-def create_project(project: schemas.ProjectCreate, token: str, db: Session = Depends(get_db)):
+async def create_project(project: schemas.ProjectCreate, token: str, db: AsyncSession = Depends(get_async_db)):
     """Create a new project for the current user."""
-    user = get_current_user(token, db)
+    user = await get_current_user_async(token, db)
     db_proj = models.Project(
         label=project.label,
         description=project.description,
@@ -20,46 +32,55 @@ def create_project(project: schemas.ProjectCreate, token: str, db: Session = Dep
         coauthors=project.coauthors,
     )
     db.add(db_proj)
-    db.commit()
-    db.refresh(db_proj)
+    await db.commit()
+    await db.refresh(db_proj)
     return db_proj
 
 
 @router.get("/{project_id}", response_model=schemas.ProjectRead)
-def read_project(project_id: int, token: str, db: Session = Depends(get_db)):
+async def read_project(
+    project_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """Return a single project if owned by the current user."""
-    user = get_current_user(token, db)
-    proj = db.query(models.Project).filter(models.Project.id == project_id, models.Project.author_id == user.id).first()
-    if not proj:
-        raise HTTPException(status_code=404, detail="Project not found")
+    user = await get_current_user_async(token, db)
+    proj = await _get_owned_project(db, project_id, user)
+    cached = etag.check(request, response, etag.make_etag("project", project_id, proj.updated_at))
+    if cached:
+        return cached
     return proj
 
 
 @router.put("/{project_id}", response_model=schemas.ProjectRead)
-def update_project(project_id: int, update: schemas.ProjectUpdate, token: str, db: Session = Depends(get_db)):
+async def update_project(
+    project_id: int,
+    update: schemas.ProjectUpdate,
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+):
     """Update a project owned by the current user."""
-    user = get_current_user(token, db)
-    proj = db.query(models.Project).filter(models.Project.id == project_id, models.Project.author_id == user.id).first()
-    if not proj:
-        raise HTTPException(status_code=404, detail="Project not found")
+    user = await get_current_user_async(token, db)
+    proj = await _get_owned_project(db, project_id, user)
     if update.label is not None:
         proj.label = update.label
     if update.description is not None:
         proj.description = update.description
     if update.coauthors is not None:
         proj.coauthors = update.coauthors
-    db.commit()
-    db.refresh(proj)
+    await db.commit()
+    await db.refresh(proj)
     return proj
 
 
 @router.delete("/{project_id}")
-def delete_project(project_id: int, token: str, db: Session = Depends(get_db)):
+async def delete_project(project_id: int, token: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a project owned by the current user."""
-    user = get_current_user(token, db)
-    proj = db.query(models.Project).filter(models.Project.id == project_id, models.Project.author_id == user.id).first()
-    if not proj:
-        raise HTTPException(status_code=404, detail="Project not found")
-    db.delete(proj)
-    db.commit()
+    user = await get_current_user_async(token, db)
+    proj = await _get_owned_project(db, project_id, user)
+    await db.delete(proj)
+    await db.commit()
+    bibliography.cache.drop(project_id)
     return {"message": "deleted"}
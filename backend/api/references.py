@@ -1,62 +1,272 @@
 """API endpoints for managing references."""
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+import os
 
 from .. import schemas, models
-from ..services import references as ref_service
-from .users import get_db, get_current_user
+from ..db import engine
+from ..services import bibliography, blobs, identity, medline, references as ref_service
+from . import etag
+from .users import get_async_db, get_async_read_db, get_current_user_async, require_admin
 
 router = APIRouter()
 
 
 @router.post("/", response_model=schemas.ReferenceRead)
-def add_reference(
+async def add_reference(
     token: str,
     project_id: int = Form(...),
     query: str = Form(...),
     pdf: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Add a reference to a project."""
-    user = get_current_user(token, db)
-    proj = db.query(models.Project).filter(models.Project.id == project_id, models.Project.author_id == user.id).first()
+    """Add a reference to a project.
+
+    Returns 409 if the project already has the paper, matched by PMID, DOI or
+    title and year, and 502 if a PMID cannot be looked up.
+    """
+    user = await get_current_user_async(token, db)
+    proj = await db.scalar(
+        select(models.Project).where(models.Project.id == project_id, models.Project.author_id == user.id)
+    )
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
-    data = ref_service.fetch_reference(query)
-    pdf_bytes = pdf.file.read() if pdf else None
-    db_ref = models.Reference(project_id=proj.id, pdf=pdf_bytes, **data)
+    catalogued = await medline.catalog_entries(db, [query]) if query.isdigit() else {}
+    try:
+        data = catalogued.get(query) or await ref_service.fetch_reference(query)
+    except ref_service.PubMedLookupError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    keys = identity.keys(dict(data, pmid=query))
+    duplicates = await identity.existing(db, proj.id, [keys])
+    if duplicates:
+        (kind, _), ref_id = next(iter(duplicates.items()))
+        raise HTTPException(status_code=409, detail=f"Same {kind} as reference {ref_id}")
+    pdf_hash = pdf_size = None
+    if pdf:
+        pdf_hash, pdf_size = await run_in_threadpool(blobs.store.put, pdf.file)
+    db_ref = models.Reference(
+        project_id=proj.id,
+        pdf_hash=pdf_hash,
+        pdf_size=pdf_size,
+        **dict(data, **keys),
+    )
     db.add(db_ref)
-    db.commit()
-    db.refresh(db_ref)
+    await db.commit()
+    await db.refresh(db_ref)
+    bibliography.cache.store(proj.id, bibliography.snapshot(db_ref))
     return db_ref
 
 
+@router.post("/batch", response_model=schemas.ReferenceBatchResult)
+async def import_references(
+    batch: schemas.ReferenceBatchCreate,
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Import many PMIDs into a project at once.
+
+    PMIDs in the local MEDLINE catalogue are taken from there, the rest are
+    fetched in chunked multi-ID efetch calls, and every reference found is
+    inserted in one transaction; the others, including papers the project
+    already has, are reported in ``failed`` with the reason.
+    """
+    user = await get_current_user_async(token, db)
+    proj = await db.scalar(
+        select(models.Project).where(models.Project.id == batch.project_id, models.Project.author_id == user.id)
+    )
+    if not proj:
+        raise HTTPException(status_code=404, detail="Project not found")
+    pmids = list(dict.fromkeys(p.strip() for p in batch.pmids))
+    invalid = {p: "Not a PMID" for p in pmids if not p.isdigit()}
+    valid = [p for p in pmids if p not in invalid]
+    found = await medline.catalog_entries(db, valid)
+    fetched, failed = await ref_service.fetch_references([p for p in valid if p not in found])
+    found.update(fetched)
+    failed.update(invalid)
+    keys = {p: identity.keys(dict(found[p], pmid=p)) for p in pmids if p in found}
+    existing = await identity.existing(db, proj.id, keys.values())
+    refs, seen = [], {}
+    for p, ref_keys in keys.items():
+        pairs = [(kind, key) for kind, key in ref_keys.items() if key]
+        clash = next((pair for pair in pairs if pair in existing or pair in seen), None)
+        if clash in existing:
+            failed[p] = f"Same {clash[0]} as reference {existing[clash]}"
+        elif clash:
+            failed[p] = f"Same {clash[0]} as PMID {seen[clash]} in this batch"
+        else:
+            seen.update(dict.fromkeys(pairs, p))
+            refs.append(models.Reference(project_id=proj.id, **dict(found[p], **ref_keys)))
+    db.add_all(refs)
+    await db.commit()
+    for ref in refs:
+        bibliography.cache.store(proj.id, bibliography.snapshot(ref))
+    return {
+        "created": refs,
+        "failed": [{"pmid": p, "error": failed[p]} for p in pmids if p in failed],
+    }
+
+
+@router.post("/catalog/import", response_model=schemas.CatalogImportResult)
+async def import_catalog(
+    body: schemas.CatalogImport,
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stream a MEDLINE/PubMed baseline file into the local catalogue.
+
+    Admin only. ``path`` is resolved inside ``MEDLINE_DIR``.
+    """
+    require_admin(await get_current_user_async(token, db))
+    root = os.getenv("MEDLINE_DIR")
+    if not root:
+        raise HTTPException(status_code=404, detail="MEDLINE_DIR is not configured")
+    root = Path(root).resolve()
+    path = (root / body.path).resolve()
+    if root not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    stats = await run_in_threadpool(medline.import_file, path, engine)
+    return {**stats._asdict(), "articles_per_second": stats.rate}
+
+
+@router.get("/duplicates", response_model=List[schemas.DuplicateGroup])
+async def list_duplicates(token: str, db: AsyncSession = Depends(get_async_read_db)):
+    """Group the user's references, across projects, that share a PMID, DOI or title fingerprint."""
+    user = await get_current_user_async(token, db)
+    groups = {}
+    for kind, key, ref in await db.execute(identity.duplicates_query(user.id)):
+        groups.setdefault((kind, key), []).append(ref)
+    return [{"kind": kind, "key": key, "references": refs} for (kind, key), refs in groups.items()]
+
+
 @router.get("/{ref_id}", response_model=schemas.ReferenceRead)
-def read_reference(ref_id: int, token: str, db: Session = Depends(get_db)):
+async def read_reference(
+    ref_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """Return a reference belonging to the current user."""
-    user = get_current_user(token, db)
-    ref = (
-        db.query(models.Reference)
+    user = await get_current_user_async(token, db)
+    query = (
+        select(models.Reference)
         .join(models.Project)
-        .filter(models.Reference.id == ref_id, models.Project.author_id == user.id)
-        .first()
+        .where(models.Reference.id == ref_id, models.Project.author_id == user.id)
+    )
+    stamp = (await db.execute(query.with_only_columns(models.Reference.updated_at))).first()
+    if not stamp:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    cached = etag.check(request, response, etag.make_etag("reference", ref_id, tuple(stamp)))
+    if cached:
+        return cached
+    return await db.scalar(query)
+
+
+async def _get_owned_reference(db: AsyncSession, ref_id: int, user: models.User) -> models.Reference:
+    ref = await db.scalar(
+        select(models.Reference)
+        .join(models.Project)
+        .where(models.Reference.id == ref_id, models.Project.author_id == user.id)
     )
     if not ref:
         raise HTTPException(status_code=404, detail="Reference not found")
     return ref
 
 
+@router.put("/{ref_id}", response_model=schemas.ReferenceRead)
+async def update_reference(
+    ref_id: int,
+    update: schemas.ReferenceUpdate,
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Edit a reference; returns 409 if it would duplicate another in the project."""
+    user = await get_current_user_async(token, db)
+    ref = await _get_owned_reference(db, ref_id, user)
+    for field in ("title", "authors", "journal", "year", "doi"):
+        value = getattr(update, field)
+        if value is not None:
+            setattr(ref, field, value)
+    keys = identity.keys({"pmid": ref.pmid, "doi": ref.doi, "title": ref.title, "year": ref.year})
+    others = {key: owner for key, owner in (await identity.existing(db, ref.project_id, [keys])).items() if owner != ref.id}
+    if others:
+        (kind, _), other = next(iter(others.items()))
+        raise HTTPException(status_code=409, detail=f"Same {kind} as reference {other}")
+    ref.doi, ref.fingerprint = keys["doi"], keys["fingerprint"]
+    await db.commit()
+    await db.refresh(ref)
+    bibliography.cache.store(ref.project_id, bibliography.snapshot(ref))
+    return ref
+
+
+@router.delete("/{ref_id}")
+async def delete_reference(ref_id: int, token: str, db: AsyncSession = Depends(get_async_db)):
+    """Delete a reference owned by the current user."""
+    user = await get_current_user_async(token, db)
+    ref = await _get_owned_reference(db, ref_id, user)
+    project_id = ref.project_id
+    await db.delete(ref)
+    await db.commit()
+    bibliography.cache.remove(project_id, ref_id)
+    return {"message": "deleted"}
+
+
+@router.get("/project/{project_id}/bibliography", response_model=schemas.Bibliography)
+async def read_bibliography(
+    project_id: int,
+    token: str,
+    style: str = "vancouver",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Return a project's reference list rendered in ``style``.
+
+    Served from the bibliography cache when the project was rendered before;
+    see ``services.bibliography``.
+    """
+    if style not in bibliography.STYLES:
+        raise HTTPException(status_code=400, detail=f"Unknown style; use one of {', '.join(bibliography.STYLES)}")
+    user = await get_current_user_async(token, db)
+    cached = bibliography.cache.get(project_id, style)
+    if cached is not None:
+        owner_id, entries = cached
+        if owner_id != user.id:
+            raise HTTPException(status_code=404, detail="Project not found")
+    else:
+        proj = await db.scalar(
+            select(models.Project.id).where(models.Project.id == project_id, models.Project.author_id == user.id)
+        )
+        if not proj:
+            raise HTTPException(status_code=404, detail="Project not found")
+        entries = await bibliography.render(db, project_id, user.id, style)
+    return {"project_id": project_id, "style": style, "entries": entries}
+
+
 @router.get("/project/{project_id}", response_model=List[schemas.ReferenceRead])
-def list_references(project_id: int, token: str, db: Session = Depends(get_db)):
+async def list_references(
+    project_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """List references for a project."""
-    user = get_current_user(token, db)
-    refs = (
-        db.query(models.Reference)
+    user = await get_current_user_async(token, db)
+    query = (
+        select(models.Reference)
         .join(models.Project)
-        .filter(models.Project.id == project_id, models.Project.author_id == user.id)
-        .all()
+        .where(models.Project.id == project_id, models.Project.author_id == user.id)
+        .order_by(models.Reference.id)
     )
-    return refs
-
+    stamps = (
+        await db.execute(query.with_only_columns(models.Reference.id, models.Reference.updated_at))
+    ).all()
+    tag = etag.make_etag("references", project_id, [tuple(row) for row in stamps])
+    cached = etag.check(request, response, tag)
+    if cached:
+        return cached
+    return (await db.scalars(query)).all()
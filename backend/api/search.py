@@ -0,0 +1,27 @@
+"""API endpoint for full-text search."""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from .. import schemas
+from ..services import search as search_service
+from .users import get_db, get_current_user
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[schemas.SearchHit])
+def search(
+    q: str,
+    token: str,
+    project_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Search the user's documents, notes and references, best matches first."""
+    user = get_current_user(token, db)
+    try:
+        return search_service.search(db, user.id, q, project_id=project_id, limit=limit)
+    except search_service.SearchUnavailable:
+        raise HTTPException(status_code=501, detail="Search requires SQLite with FTS5")
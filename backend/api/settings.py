@@ -1,49 +1,76 @@
 """API endpoints for user and global settings."""
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from .. import schemas, models
-from .users import get_db, get_current_user
+from ..services import settings as settings_service
+from .users import get_async_db, get_async_read_db, get_current_user_async
 
 router = APIRouter()
 
 
 @router.post("/", response_model=schemas.SettingRead)
-def set_setting(setting: schemas.SettingCreate, token: str, db: Session = Depends(get_db)):
+async def set_setting(setting: schemas.SettingCreate, token: str, db: AsyncSession = Depends(get_async_db)):
     """Create or update a setting for the current user."""
-    user = get_current_user(token, db) if setting.user_based else None
-    query = db.query(models.Setting).filter(models.Setting.key == setting.key)
+    user = await get_current_user_async(token, db) if setting.user_based else None
+    user_id = user.id if user else None
+    query = select(models.Setting).where(models.Setting.key == setting.key)
     if user:
-        query = query.filter(models.Setting.user_id == user.id)
+        query = query.where(models.Setting.user_id == user_id)
     else:
-        query = query.filter(models.Setting.user_id.is_(None))
-    obj = query.first()
+        query = query.where(models.Setting.user_id.is_(None))
+    obj = await db.scalar(query)
     if obj:
         obj.value = setting.value
     else:
-        obj = models.Setting(key=setting.key, value=setting.value, user_id=user.id if user else None)
+        obj = models.Setting(key=setting.key, value=setting.value, user_id=user_id)
         db.add(obj)
-    db.commit()
-    db.refresh(obj)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request created the same setting first; update it.
+        await db.rollback()
+        obj = await db.scalar(query)
+        obj.value = setting.value
+        await db.commit()
+    await db.refresh(obj)
+    settings_service.cache.store(settings_service.snapshot(obj))
     return obj
 
 
+async def _optional_user(token: str, db: AsyncSession) -> Optional[models.User]:
+    if not token:
+        return None
+    try:
+        return await get_current_user_async(token, db)
+    except HTTPException:
+        return None
+
+
+@router.get("/", response_model=List[schemas.SettingRead])
+async def resolve_settings(
+    token: str = "",
+    keys: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Resolve several settings (``keys``, repeatable) or all of them at once.
+
+    User-specific values override global ones, as in ``get_setting``.
+    """
+    user = await _optional_user(token, db)
+    resolved = await settings_service.resolve(db, user.id if user else None, keys)
+    return [resolved[key] for key in sorted(resolved)]
+
+
 @router.get("/{key}", response_model=schemas.SettingRead)
-def get_setting(key: str, token: str = "", db: Session = Depends(get_db)):
+async def get_setting(key: str, token: str = "", db: AsyncSession = Depends(get_async_read_db)):
     """Retrieve a setting. User-specific value overrides global."""
-    user = None
-    if token:
-        try:
-            user = get_current_user(token, db)
-        except HTTPException:
-            user = None
-    if user:
-        obj = db.query(models.Setting).filter(models.Setting.key == key, models.Setting.user_id == user.id).first()
-        if obj:
-            return obj
-    obj = db.query(models.Setting).filter(models.Setting.key == key, models.Setting.user_id.is_(None)).first()
-    if not obj:
+    user = await _optional_user(token, db)
+    resolved = await settings_service.resolve(db, user.id if user else None, [key])
+    if key not in resolved:
         raise HTTPException(status_code=404, detail="Setting not found")
-    return obj
-
+    return resolved[key]
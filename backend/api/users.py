@@ -1,39 +1,79 @@
 """API endpoints for user management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import schemas, models
-from ..services import auth
-from ..db import SessionLocal, Base, engine
-
-Base.metadata.create_all(bind=engine)
+from ..services import auth, principals, replica
+from ..db import AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal
 
 router = APIRouter()
 
 
-def get_db():
+def get_db(request: Request):
     """Provide a database session dependency."""
 
     db = SessionLocal()
+    db.info[replica.TOKEN_KEY] = request.query_params.get("token")
     try:
         yield db
     finally:
         db.close()
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    """Return a user if the credentials are valid."""
+async def get_async_db(request: Request):
+    """Provide an async database session dependency."""
+
+    async with AsyncSessionLocal() as db:
+        db.info[replica.TOKEN_KEY] = request.query_params.get("token")
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    """Provide an async session for read-only endpoints.
+
+    Uses the read replica unless the caller committed a write recently.
+    """
+
+    token = request.query_params.get("token")
+    factory = AsyncSessionLocal if replica.use_primary(token) else AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """Return a user if the credentials are valid.
+
+    A password hash made under an outdated bcrypt policy is replaced.
+    """
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user or not auth.verify_password(password, user.password_hash):
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+    if not user:
+        return None
+    valid, new_hash = await auth.verify_and_update_password_async(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+        principals.invalidate_user(user.id)
     return user
 
 
 def get_current_user(token: str, db: Session) -> models.User:
-    """Return the user associated with an access token."""
+    """Return the user associated with an access token.
+
+    Verified tokens are remembered in the principal cache, so repeat calls
+    skip both the signature check and the user lookup.
+    """
 
+    user = principals.lookup(token, db)
+    if user is not None:
+        return user
     payload = auth.decode_access_token(token)
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -41,15 +81,40 @@ def get_current_user(token: str, db: Session) -> models.User:
     user = db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    principals.remember(token, user, payload["exp"])
+    return user
+
+
+async def get_current_user_async(token: str, db: AsyncSession) -> models.User:
+    """Async variant of ``get_current_user`` sharing the principal cache."""
+
+    user = principals.cached_user(token)
+    if user is not None:
+        return await db.merge(user, load=False)
+    payload = auth.decode_access_token(token)
+    if not payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    user = await db.get(models.User, int(payload.get("sub")))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    principals.remember(token, user, payload["exp"])
     return user
 
 
+def require_admin(user: models.User) -> None:
+    """Raise 403 unless ``user`` is the configured admin (``ADMIN_USERNAME``)."""
+
+    admin = os.getenv("ADMIN_USERNAME")
+    if not admin or user.username != admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+
+
 @router.post("/register", response_model=schemas.UserRead)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user and return the created record."""
-    if db.query(models.User).filter(models.User.username == user.username).first():
+    if await db.scalar(select(models.User.id).where(models.User.username == user.username)):
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_pw = auth.get_password_hash(user.password)
+    hashed_pw = await auth.get_password_hash_async(user.password)
     db_user = models.User(
         username=user.username,
         password_hash=hashed_pw,
@@ -59,15 +124,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         email=user.email,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def login(form_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Authenticate and return an access token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     token = auth.create_access_token({"sub": str(user.id)})
@@ -77,14 +142,7 @@ def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
 @router.get("/me", response_model=schemas.UserRead)
 def read_me(token: str, db: Session = Depends(get_db)):
     """Return the currently logged-in user."""
-    payload = auth.decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user_id = int(payload.get("sub"))
-    user = db.get(models.User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return get_current_user(token, db)
 
 
 @router.put("/me", response_model=schemas.UserRead)
@@ -94,13 +152,7 @@ def update_me(
     db: Session = Depends(get_db),
 ):
     """Update fields for the current user."""
-    payload = auth.decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user_id = int(payload.get("sub"))
-    user = db.get(models.User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = get_current_user(token, db)
     if update.password:
         user.password_hash = auth.get_password_hash(update.password)
     if update.first_name is not None:
@@ -112,9 +164,18 @@ def update_me(
     if update.email is not None:
         user.email = update.email
     db.commit()
+    principals.invalidate_user(user.id)
     db.refresh(user)
     return user
 
+
+@router.get("/hashing/metrics")
+def hashing_metrics(token: str, db: Session = Depends(get_db)):
+    """Return load and latency counters of the password hashing executor (admin only)."""
+    require_admin(get_current_user(token, db))
+    return auth.hashing.metrics()
+
+
 @router.post("/logout")
 def logout():
     """Placeholder logout endpoint."""
@@ -1,11 +1,11 @@
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Dict
 
-# Load environment variables from the repository root
-load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Store application data inside the repository to avoid permission issues
 ROOT_DIR = Path(__file__).resolve().parents[1]
@@ -21,11 +21,128 @@ else:
     DB_PATH = APPDATA_PATH / DB_NAME
     APPDATA_PATH.mkdir(parents=True, exist_ok=True)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+SQLITE_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# ``DATABASE_URL`` points the app at another database (e.g. Postgres);
+# ``DB_PROFILE`` overrides the profile otherwise inferred from its scheme.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or SQLITE_DATABASE_URL
+DB_PROFILE = os.getenv("DB_PROFILE") or make_url(SQLALCHEMY_DATABASE_URL).get_backend_name()
+
+
+def _async_url(url: str) -> URL:
+    """Return ``url`` with the asyncio driver of its backend."""
+    url = make_url(url)
+    driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}[url.get_backend_name()]
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """PRAGMAs applied to every new SQLite connection.
+
+    WAL lets readers proceed while a writer commits (e.g. autosaves), and
+    ``synchronous=NORMAL`` only fsyncs at checkpoints, which is safe in WAL
+    mode. ``SQLITE_CACHE_SIZE`` follows SQLite's convention: negative values
+    are KiB, positive values pages.
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+        "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+        "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),
+    }
+
+
+def postgres_options() -> Dict:
+    """Pool settings for the Postgres profile."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False"),
+    }
+
+
+def _statement_timeout_ms() -> int:
+    return int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def _sqlite_pragma_listener(read_only: bool):
+    def apply(dbapi_connection, connection_record) -> None:
+        pragmas = sqlite_pragmas()
+        if read_only:
+            pragmas["query_only"] = "ON"
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+    return apply
+
+
+def make_engines(url: str, profile: str, read_only: bool = False):
+    """Create the sync and async engines for ``url`` tuned for ``profile``.
+
+    ``read_only`` engines (replicas) refuse writes at the database level.
+    """
+    if profile == "sqlite":
+        sync = create_engine(url, connect_args={"check_same_thread": False})
+        async_ = create_async_engine(_async_url(url))
+        for target in (sync, async_.sync_engine):
+            event.listen(target, "connect", _sqlite_pragma_listener(read_only))
+    elif profile == "postgresql":
+        settings = {"statement_timeout": str(_statement_timeout_ms())}
+        if read_only:
+            settings["default_transaction_read_only"] = "on"
+        options = " ".join(f"-c {k}={v}" for k, v in settings.items())
+        sync = create_engine(url, connect_args={"options": options}, **postgres_options())
+        async_ = create_async_engine(
+            _async_url(url),
+            connect_args={"server_settings": settings},
+            **postgres_options(),
+        )
+    else:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}")
+    return sync, async_
+
+
+def describe_profile() -> str:
+    """One-line summary of the active engine profile for the startup log."""
+    url = engine.url.render_as_string(hide_password=True)
+    if DB_PROFILE == "sqlite":
+        settings = sqlite_pragmas()
+    else:
+        settings = dict(postgres_options(), statement_timeout_ms=_statement_timeout_ms())
+    summary = f"{DB_PROFILE} profile on {url}: " + ", ".join(f"{k}={v}" for k, v in settings.items())
+    if async_replica_engine is not async_engine:
+        summary += "; reads from replica " + async_replica_engine.url.render_as_string(hide_password=True)
+    return summary
+
+
+engine, async_engine = make_engines(SQLALCHEMY_DATABASE_URL, DB_PROFILE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async data path used by the document, project, reference and settings
+# routers. Objects stay loaded after commit because an expired attribute
+# cannot be lazily refreshed outside of an ``await``.
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Optional read replica (same profile as the primary) for GET endpoints; see
+# ``services.replica`` for when reads are routed to it. Without
+# ``DATABASE_REPLICA_URL`` reads use the primary.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if DATABASE_REPLICA_URL:
+    _, async_replica_engine = make_engines(DATABASE_REPLICA_URL, DB_PROFILE, read_only=True)
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_replica_engine, autoflush=False, expire_on_commit=False
+    )
+else:
+    async_replica_engine = async_engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
 Base = declarative_base()
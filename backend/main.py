@@ -1,11 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import IntegrityError
+import logging
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables from the repository root
-load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
 from .api.crud import router as crud_router
 from .api.ai import router as ai_router
@@ -14,39 +12,91 @@ from .api.documents import router as docs_router
 from .api.projects import router as projects_router
 from .api.references import router as references_router
 from .api.settings import router as settings_router
-from .db import Base, engine, SessionLocal
+from .api.search import router as search_router
+from . import migrations
+from .db import SessionLocal, describe_profile
 from .models import User
-from .services.auth import get_password_hash
+from .services.auth import HashingOverloaded, get_password_hash
+from .services import pdf_text, references, retention
 
 # Configure CORS - Allow all origins for development
 origins = ["*"]  # Allow all origins
 
 
-# Ensure database exists
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI()
 
+logger = logging.getLogger(__name__)
+
+
+@app.exception_handler(HashingOverloaded)
+def hashing_overloaded(request: Request, exc: HashingOverloaded):
+    """Shed password hashing load instead of queueing behind it."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many concurrent password operations"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+def log_database_profile():
+    """Record which database engine profile is in use."""
+    logger.info("Database: %s", describe_profile())
+
+
+@app.on_event("startup")
+def apply_migrations():
+    """Upgrade the schema unless migrations are run before the workers start."""
+    if os.getenv("DB_MIGRATE_ON_STARTUP", "1") not in ("0", "false", "False"):
+        migrations.upgrade()
+
 
 @app.on_event("startup")
 def ensure_admin_user():
-    """Create default admin user if not present."""
+    """Create default admin user if not present.
+
+    Safe to run from several workers at once: the unique username lets one
+    insert win and the others back off.
+    """
     username = os.getenv("ADMIN_USERNAME")
     password = os.getenv("ADMIN_PASSWORD")
     if not username or not password:
         return
     db = SessionLocal()
     try:
-        if not db.query(User).filter(User.username == username).first():
-            admin = User(
-                username=username,
-                password_hash=get_password_hash(password),
-            )
-            db.add(admin)
+        if not db.query(User.id).filter(User.username == username).first():
+            db.add(User(username=username, password_hash=get_password_hash(password)))
             db.commit()
+    except IntegrityError:
+        db.rollback()
     finally:
         db.close()
 
+
+_compactor = None
+
+
+@app.on_event("startup")
+def start_revision_compaction():
+    """Run revision retention in the background when an interval is configured."""
+    global _compactor
+    interval = retention.compaction_interval()
+    if interval > 0:
+        _compactor = retention.Compactor(SessionLocal, interval)
+        _compactor.start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    if _compactor is not None:
+        _compactor.stop()
+    pdf_text.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_pubmed_client():
+    await references.client.aclose()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -60,6 +110,7 @@ app.include_router(docs_router, prefix="/documents", tags=["documents"])
 app.include_router(projects_router, prefix="/projects", tags=["projects"])
 app.include_router(references_router, prefix="/references", tags=["references"])
 app.include_router(settings_router, prefix="/settings", tags=["settings"])
+app.include_router(search_router, prefix="/search", tags=["search"])
 app.include_router(crud_router, prefix="/db", tags=["database"])
 app.include_router(ai_router, prefix="/ai", tags=["ai"])
 
@@ -0,0 +1,116 @@
+"""Versioned schema migrations.
+
+Migrations are modules in this package named ``mNNNN_<description>.py`` with
+an ``upgrade(connection)`` function; ``NNNN`` is the schema version they
+produce. Applied versions are recorded in ``schema_migrations``.
+
+The models always describe the newest schema, so an empty database is created
+from them directly and stamped with every version. A database that predates
+versioning runs every migration, starting with the baseline, which brings
+whatever schema ``create_all`` left it with forward.
+
+``upgrade`` holds a database-wide lock (``BEGIN IMMEDIATE`` on SQLite, an
+advisory lock on Postgres) while it runs, so concurrent callers such as
+several workers starting at once apply each migration exactly once. Run it
+before starting the workers with::
+
+    python -m backend.migrations
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, func, inspect, select, text
+
+from .. import models  # noqa: F401  (registers all tables on Base.metadata)
+from ..db import Base, engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# First migration; unversioned databases are upgraded starting here.
+BASELINE = 1
+
+# Arbitrary key for pg_advisory_xact_lock.
+_LOCK_KEY = 0x5752_4454
+
+_versions = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable
+
+
+def discover() -> List[Migration]:
+    """Return all migrations of this package ordered by version."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = re.fullmatch(r"m(\d{4})_\w+", info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            found.append(Migration(int(match.group(1)), info.name, module.upgrade))
+    return sorted(found)
+
+
+@contextmanager
+def _locked(engine):
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # Manage the transaction by hand: BEGIN IMMEDIATE takes the write
+            # lock up front, and SQLite DDL is transactional.
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql("PRAGMA busy_timeout = 60000")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+        else:
+            with conn.begin():
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+                yield conn
+
+
+def current_version(conn) -> Optional[int]:
+    if not inspect(conn).has_table(_versions.name):
+        return None
+    return conn.execute(select(func.max(_versions.c.version))).scalar()
+
+
+def _stamp(conn, versions) -> None:
+    conn.execute(_versions.insert(), [{"version": v} for v in versions])
+
+
+def upgrade(engine=None) -> int:
+    """Bring the database up to the newest version and return that version."""
+    engine = engine or default_engine
+    migrations = discover()
+    head = migrations[-1].version
+    with _locked(engine) as conn:
+        current = current_version(conn)
+        _versions.create(conn, checkfirst=True)
+        if current is None and not inspect(conn).has_table("users"):
+            logger.info("Creating schema at version %s", head)
+            Base.metadata.create_all(conn)
+            _stamp(conn, [m.version for m in migrations])
+            return head
+        if current is None:
+            current = BASELINE - 1
+        for migration in migrations:
+            if migration.version > current:
+                logger.info("Applying migration %s", migration.name)
+                migration.upgrade(conn)
+                _stamp(conn, [migration.version])
+    return head
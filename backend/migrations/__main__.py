@@ -0,0 +1,8 @@
+"""Apply pending migrations: ``python -m backend.migrations``."""
+
+import logging
+
+from . import upgrade
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+print(f"Database schema at version {upgrade()}")
@@ -0,0 +1,123 @@
+"""Baseline: bring a database that predates versioned migrations up to date.
+
+Until migrations existed the schema was made by ``create_all``, which creates
+missing tables but never alters existing ones. A database from that time can
+therefore be anywhere between the original schema and the models as they were
+when versioning started. Every step here checks what is already there, so
+this works from any of those states.
+"""
+
+import io
+import sqlite3
+
+from sqlalchemy import inspect, text
+
+from .. import models
+from ..models import search
+from ..services import blobs
+
+# (table, column, DDL type) added to existing tables, oldest first.
+_COLUMNS = [
+    # Reverse-delta revision storage.
+    ("document_revisions", "seq", "INTEGER NOT NULL DEFAULT 1"),
+    ("document_revisions", "delta", "TEXT"),
+    # Autosave coalescing.
+    ("document_revisions", "author_id", "INTEGER REFERENCES users (id)"),
+    # Content-addressed blob store.
+    ("documents", "pdf_hash", "VARCHAR(64)"),
+    ("documents", "pdf_size", "INTEGER"),
+    ("documents", "image_hash", "VARCHAR(64)"),
+    ("documents", "image_size", "INTEGER"),
+    ("references", "pdf_hash", "VARCHAR(64)"),
+    ("references", "pdf_size", "INTEGER"),
+    # Background PDF text extraction.
+    ("documents", "extraction_status", "VARCHAR"),
+    # Versioned patch protocol.
+    ("documents", "version", "INTEGER NOT NULL DEFAULT 1"),
+    # Conditional GETs.
+    ("documents", "updated_at", "TIMESTAMP"),
+    ("projects", "updated_at", "TIMESTAMP"),
+    ("references", "updated_at", "TIMESTAMP"),
+]
+
+
+def _columns(connection, table):
+    return {c["name"] for c in inspect(connection).get_columns(table)}
+
+
+def _add_columns(connection) -> None:
+    existing = {}
+    for table, column, ddl in _COLUMNS:
+        if table not in existing:
+            existing[table] = _columns(connection, table)
+        if column not in existing[table]:
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+            existing[table].add(column)
+            if column == "updated_at":
+                connection.execute(text(f'UPDATE "{table}" SET updated_at = CURRENT_TIMESTAMP'))
+            if column == "seq":
+                _number_revisions(connection)
+
+
+def _number_revisions(connection) -> None:
+    # Revisions written before sequence numbers all hold their full text, so
+    # numbering them oldest first per document yields a valid chain.
+    connection.execute(text(
+        """
+        UPDATE document_revisions SET seq = (
+            SELECT count(*) FROM document_revisions AS older
+            WHERE older.document_id = document_revisions.document_id
+              AND older.id <= document_revisions.id
+        )
+        """
+    ))
+
+
+# (table, former BLOB column, hash column, size column)
+_BLOBS = [
+    ("documents", "pdf", "pdf_hash", "pdf_size"),
+    ("documents", "image", "image_hash", "image_size"),
+    ("references", "pdf", "pdf_hash", "pdf_size"),
+]
+
+
+def _can_drop_columns(connection) -> bool:
+    return connection.dialect.name != "sqlite" or sqlite3.sqlite_version_info >= (3, 35)
+
+
+def _move_blobs(connection) -> None:
+    """Copy file bytes stored in the database into the blob store."""
+    for table, column, hash_column, size_column in _BLOBS:
+        if column not in _columns(connection, table):
+            continue
+        ids = connection.execute(text(
+            f'SELECT id FROM "{table}" WHERE {column} IS NOT NULL AND {hash_column} IS NULL'
+        )).scalars().all()
+        # One row at a time, so at most one file is held in memory.
+        for row_id in ids:
+            data = connection.execute(
+                text(f'SELECT {column} FROM "{table}" WHERE id = :id'), {"id": row_id}
+            ).scalar()
+            digest, size = blobs.store.put(io.BytesIO(data))
+            connection.execute(
+                text(f'UPDATE "{table}" SET {hash_column} = :digest, {size_column} = :size WHERE id = :id'),
+                {"digest": digest, "size": size, "id": row_id},
+            )
+        # Only now that every row points into the blob store is the column given up.
+        if _can_drop_columns(connection):
+            connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN {column}'))
+        else:
+            connection.execute(text(f'UPDATE "{table}" SET {column} = NULL'))
+
+
+def upgrade(connection) -> None:
+    _add_columns(connection)
+    _move_blobs(connection)
+    # Per-page cache of extracted PDF text.
+    models.PdfTextPage.__table__.create(connection, checkfirst=True)
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_revisions_document_created "
+        "ON document_revisions (document_id, created_at)"
+    ))
+    # Full-text search: table, backfill and triggers (SQLite only).
+    search.install_search_index(connection)
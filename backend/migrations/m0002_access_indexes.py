@@ -0,0 +1,27 @@
+"""Indexes for the per-user and per-project lookups, unique settings keys."""
+
+from sqlalchemy import text
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_documents_creator_project_position ON documents (creator_id, project_id, position)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_author_id ON projects (author_id)",
+    'CREATE INDEX IF NOT EXISTS ix_references_project_id ON "references" (project_id)',
+    "CREATE INDEX IF NOT EXISTS ix_document_revisions_document_seq ON document_revisions (document_id, seq)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_settings_key_user ON settings (key, user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_settings_key_global ON settings (key) WHERE user_id IS NULL",
+]
+
+
+def upgrade(connection) -> None:
+    # IF NOT EXISTS: databases created by ``create_all`` from newer models
+    # before they were versioned may have some of these already.
+    # Concurrent upserts may have left duplicate settings; keep the newest.
+    connection.execute(text(
+        """
+        DELETE FROM settings WHERE id NOT IN (
+            SELECT max(id) FROM settings GROUP BY key, coalesce(user_id, -1)
+        )
+        """
+    ))
+    for statement in _INDEXES:
+        connection.execute(text(statement))
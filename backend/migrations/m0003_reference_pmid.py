@@ -0,0 +1,10 @@
+"""Record the PMID of references fetched from PubMed."""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection) -> None:
+    # See m0002: the column may exist if ``create_all`` made the table.
+    if "pmid" not in {c["name"] for c in inspect(connection).get_columns("references")}:
+        connection.execute(text('ALTER TABLE "references" ADD COLUMN pmid VARCHAR(16)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_references_pmid ON "references" (pmid)'))
@@ -0,0 +1,18 @@
+"""Local catalogue of articles imported from MEDLINE baseline files."""
+
+from sqlalchemy import text
+
+
+def upgrade(connection) -> None:
+    connection.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS reference_catalog (
+            pmid VARCHAR(16) PRIMARY KEY,
+            title VARCHAR,
+            authors VARCHAR,
+            journal VARCHAR,
+            year VARCHAR,
+            imported_at TIMESTAMP
+        )
+        """
+    ))
@@ -0,0 +1,39 @@
+"""Identity keys (PMID, DOI, title fingerprint) for duplicate detection."""
+
+from sqlalchemy import inspect, text
+
+from ..services import identity
+
+_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_references_pmid_project ON "references" (pmid, project_id)',
+    'CREATE INDEX IF NOT EXISTS ix_references_doi_project ON "references" (doi, project_id)',
+    'CREATE INDEX IF NOT EXISTS ix_references_fingerprint_project ON "references" (fingerprint, project_id)',
+]
+
+
+def _add_column(connection, table, column, ddl):
+    # See m0002: the column may exist if ``create_all`` made the table.
+    if column not in {c["name"] for c in inspect(connection).get_columns(table)}:
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def upgrade(connection) -> None:
+    _add_column(connection, "references", "doi", "VARCHAR(255)")
+    _add_column(connection, "references", "fingerprint", "VARCHAR(40)")
+    _add_column(connection, "reference_catalog", "doi", "VARCHAR(255)")
+    # Superseded by the (pmid, project_id) index.
+    connection.execute(text("DROP INDEX IF EXISTS ix_references_pmid"))
+    for statement in _INDEXES:
+        connection.execute(text(statement))
+
+    rows = connection.execute(
+        text('SELECT id, title, year FROM "references" WHERE fingerprint IS NULL')
+    ).all()
+    updates = [
+        {"id": row.id, "fingerprint": identity.fingerprint(row.title, row.year)}
+        for row in rows
+    ]
+    if updates:
+        connection.execute(
+            text('UPDATE "references" SET fingerprint = :fingerprint WHERE id = :id'), updates
+        )
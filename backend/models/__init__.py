@@ -4,10 +4,10 @@ from sqlalchemy import (
     Column,
     Integer,
     String,
-    LargeBinary,
     Text,
     ForeignKey,
     DateTime,
+    Index,
 )
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -21,6 +21,8 @@ __all__ = [
     "Project",
     "Reference",
     "Setting",
+    "PdfTextPage",
+    "CatalogEntry",
 ]
 
 class User(Base):
@@ -43,19 +45,29 @@ class Document(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text)
-    pdf = Column(LargeBinary)
-    image = Column(LargeBinary)
+    version = Column(Integer, nullable=False, default=1)
+    pdf_hash = Column(String(64))
+    pdf_size = Column(Integer)
+    image_hash = Column(String(64))
+    image_size = Column(Integer)
+    extraction_status = Column(String)
     label = Column(String)
     description = Column(String)
     creator_id = Column(Integer, ForeignKey("users.id"))
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     notes = Column(String)
     position = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     owner = relationship("User", back_populates="documents")
     project = relationship("Project", back_populates="documents")
     revisions = relationship("DocumentRevision", back_populates="document", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Per-user project listings: filter on both, ordered by position.
+        Index("ix_documents_creator_project_position", "creator_id", "project_id", "position"),
+    )
+
 
 class Project(Base):
     """A collection of documents with associated metadata."""
@@ -65,8 +77,9 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     label = Column(String, nullable=False)
     description = Column(String)
-    author_id = Column(Integer, ForeignKey("users.id"))
+    author_id = Column(Integer, ForeignKey("users.id"), index=True)
     coauthors = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     author = relationship("User")
     documents = relationship("Document", back_populates="project")
@@ -83,11 +96,23 @@ class Reference(Base):
     authors = Column(String)
     journal = Column(String)
     year = Column(String)
-    pdf = Column(LargeBinary)
-    project_id = Column(Integer, ForeignKey("projects.id"))
+    # Identity keys, normalized by ``services.identity``.
+    pmid = Column(String(16))
+    doi = Column(String(255))
+    fingerprint = Column(String(40))
+    pdf_hash = Column(String(64))
+    pdf_size = Column(Integer)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project", back_populates="references")
 
+    __table_args__ = (
+        Index("ix_references_pmid_project", "pmid", "project_id"),
+        Index("ix_references_doi_project", "doi", "project_id"),
+        Index("ix_references_fingerprint_project", "fingerprint", "project_id"),
+    )
+
 
 class Setting(Base):
     """User or global configuration setting."""
@@ -101,15 +126,69 @@ class Setting(Base):
 
     user = relationship("User")
 
+    # One value per key and user, and one global (user_id NULL) value per
+    # key; NULLs never collide in a plain unique index.
+    __table_args__ = (
+        Index("ux_settings_key_user", "key", "user_id", unique=True),
+        Index(
+            "ux_settings_key_global",
+            "key",
+            unique=True,
+            sqlite_where=user_id.is_(None),
+            postgresql_where=user_id.is_(None),
+        ),
+    )
+
 
 class DocumentRevision(Base):
-    """Historical record of document text changes."""
+    """Historical record of document text changes.
+
+    Only keyframes and the newest revision keep ``text``; the others store a
+    reverse ``delta`` against the next newer revision (see
+    ``services.revisions``).
+    """
 
     __tablename__ = "document_revisions"
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    seq = Column(Integer, nullable=False, default=1)
     text = Column(Text)
+    delta = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     document = relationship("Document", back_populates="revisions")
+
+    __table_args__ = (
+        Index("ix_document_revisions_document_created", "document_id", "created_at"),
+        Index("ix_document_revisions_document_seq", "document_id", "seq"),
+    )
+
+
+class PdfTextPage(Base):
+    """Extracted text of one PDF page, shared by every upload of that PDF."""
+
+    __tablename__ = "pdf_text_pages"
+
+    pdf_hash = Column(String(64), primary_key=True)
+    page = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+
+
+class CatalogEntry(Base):
+    """Article preloaded from a MEDLINE/PubMed baseline file (see ``services.medline``)."""
+
+    __tablename__ = "reference_catalog"
+
+    pmid = Column(String(16), primary_key=True)
+    title = Column(String)
+    authors = Column(String)
+    journal = Column(String)
+    year = Column(String)
+    doi = Column(String(255))
+    imported_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Registers the FTS index DDL so it is created alongside the tables above.
+from . import search  # noqa: E402,F401
@@ -0,0 +1,110 @@
+"""SQLite FTS5 index over documents and references.
+
+``search_index`` is an FTS5 table with one row per document (rowid ``2 * id``)
+and per reference (rowid ``2 * id + 1``). Triggers on ``documents`` and
+``references`` keep it up to date on every insert, update and delete, however
+the change is made. The index is created and backfilled together with the
+rest of the schema and is skipped on databases other than SQLite.
+"""
+
+from sqlalchemy import event, text
+
+from ..db import Base
+
+DOCUMENT_KIND = "document"
+REFERENCE_KIND = "reference"
+
+_TABLE = """
+CREATE VIRTUAL TABLE search_index USING fts5(
+    kind UNINDEXED,
+    item_id UNINDEXED,
+    project_id UNINDEXED,
+    owner_id UNINDEXED,
+    title,
+    body,
+    meta,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+_DOCUMENT_ROW = (
+    "new.id * 2, 'document', new.id, new.project_id, new.creator_id, "
+    "new.label, new.text, new.notes"
+)
+
+_REFERENCE_ROW = (
+    "new.id * 2 + 1, 'reference', new.id, new.project_id, "
+    "(SELECT author_id FROM projects WHERE projects.id = new.project_id), "
+    "new.title, NULL, "
+    "coalesce(new.authors, '') || ' ' || coalesce(new.journal, '') || ' ' || coalesce(new.year, '')"
+)
+
+_COLUMNS = "rowid, kind, item_id, project_id, owner_id, title, body, meta"
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS documents_search_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO search_index({_COLUMNS}) VALUES ({_DOCUMENT_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS documents_search_update
+    AFTER UPDATE OF label, text, notes, project_id, creator_id ON documents BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+        INSERT INTO search_index({_COLUMNS}) VALUES ({_DOCUMENT_ROW});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_search_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS references_search_insert AFTER INSERT ON "references" BEGIN
+        INSERT INTO search_index({_COLUMNS}) VALUES ({_REFERENCE_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS references_search_update
+    AFTER UPDATE OF title, authors, journal, year, project_id ON "references" BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO search_index({_COLUMNS}) VALUES ({_REFERENCE_ROW});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS references_search_delete AFTER DELETE ON "references" BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+_BACKFILL = [
+    f"""
+    INSERT INTO search_index({_COLUMNS})
+    SELECT {_DOCUMENT_ROW.replace("new.", "d.")} FROM documents AS d
+    """,
+    f"""
+    INSERT INTO search_index({_COLUMNS})
+    SELECT {_REFERENCE_ROW.replace("new.", "r.")} FROM "references" AS r
+    """,
+]
+
+
+def install_search_index(connection) -> None:
+    """Create, backfill and wire up ``search_index`` if it does not exist."""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first()
+    if not exists:
+        connection.execute(text(_TABLE))
+        for stmt in _BACKFILL:
+            connection.execute(text(stmt))
+    for stmt in _TRIGGERS:
+        connection.execute(text(stmt))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -46,11 +46,40 @@ class DocumentUpdate(DocumentBase):
 
 class DocumentRead(DocumentBase):
     id: int
+    version: int
+    extraction_status: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class DocumentPatch(BaseModel):
+    base_version: int
+    patch: str
+
+
+class DocumentPatchResult(BaseModel):
+    id: int
+    version: int
+    checksum: str
+
+
+class DocumentSummary(BaseModel):
+    id: int
+    label: Optional[str] = None
+    description: Optional[str] = None
+    project_id: Optional[int] = None
+    position: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ExtractionStatus(BaseModel):
+    document_id: int
+    status: Optional[str] = None
+
+
 class DocumentRevisionRead(BaseModel):
     id: int
     document_id: int
@@ -95,11 +124,63 @@ class ReferenceRead(BaseModel):
     authors: str
     journal: str
     year: str
+    pmid: Optional[str] = None
+    doi: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class ReferenceUpdate(BaseModel):
+    title: Optional[str] = None
+    authors: Optional[str] = None
+    journal: Optional[str] = None
+    year: Optional[str] = None
+    doi: Optional[str] = None
+
+
+class Bibliography(BaseModel):
+    project_id: int
+    style: str
+    entries: List[str]
+
+
+class DuplicateReference(ReferenceRead):
+    project_id: int
+
+
+class DuplicateGroup(BaseModel):
+    kind: str
+    key: str
+    references: List[DuplicateReference]
+
+
+class ReferenceBatchCreate(BaseModel):
+    project_id: int
+    pmids: List[str]
+
+
+class ReferenceImportFailure(BaseModel):
+    pmid: str
+    error: str
+
+
+class ReferenceBatchResult(BaseModel):
+    created: List[ReferenceRead]
+    failed: List[ReferenceImportFailure]
+
+
+class CatalogImport(BaseModel):
+    path: str
+
+
+class CatalogImportResult(BaseModel):
+    articles: int
+    deleted: int
+    seconds: float
+    articles_per_second: float
+
+
 class SettingCreate(BaseModel):
     key: str
     value: str
@@ -114,3 +195,12 @@ class SettingRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    project_id: Optional[int] = None
+    title: Optional[str] = None
+    snippet: str
+    rank: float
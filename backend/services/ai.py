@@ -0,0 +1,65 @@
+"""Pluggable text generation backends for the AI endpoints.
+
+A backend streams a completion as text chunks ("tokens"). The default
+``stub`` backend is a local, deterministic model: it echoes the prompt in the
+Master Control Program style, word by word, optionally pausing
+``AI_STUB_TOKEN_DELAY`` seconds per token to behave like a remote model.
+``AI_BACKEND`` selects another backend as ``package.module:factory``; the
+factory is called without arguments and must return an ``AIBackend``.
+"""
+
+import abc
+import asyncio
+import importlib
+import os
+import re
+from typing import AsyncIterator, Optional
+
+
+class AIBackend(abc.ABC):
+    """Interface of a text generation backend."""
+
+    @abc.abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion of ``prompt`` chunk by chunk."""
+
+    async def complete(self, prompt: str) -> str:
+        """Return the whole completion; backends may override with a non-streaming call."""
+        return "".join([token async for token in self.stream(prompt)])
+
+
+class StubBackend(AIBackend):
+    """Deterministic local model echoing the prompt."""
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = prompt.strip() or "..."
+        # Words with their trailing whitespace, so the tokens join back exactly.
+        for token in re.findall(r"\S+\s*", f"MCP mock reply: {text}"):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def load_backend(spec: Optional[str] = None) -> AIBackend:
+    """Build the backend named by ``spec`` (default ``AI_BACKEND``)."""
+    spec = spec or os.getenv("AI_BACKEND", "stub")
+    if spec == "stub":
+        return StubBackend(token_delay=float(os.getenv("AI_STUB_TOKEN_DELAY", "0")))
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"AI_BACKEND must be 'stub' or 'module:factory', not {spec!r}")
+    return getattr(importlib.import_module(module), factory)()
+
+
+_backend: Optional[AIBackend] = None
+
+
+def get_backend() -> AIBackend:
+    """Return the configured backend, built on first use."""
+    global _backend
+    if _backend is None:
+        _backend = load_backend()
+    return _backend
@@ -1,16 +1,14 @@
 """Authentication helpers."""
 
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
+import threading
+import time
 
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-# Ensure environment variables are loaded when this module is imported
-load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
@@ -18,18 +16,122 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(
     os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class HashingOverloaded(Exception):
+    """Raised when the password hashing queue is full."""
+
+
+class HashingExecutor:
+    """Runs bcrypt on a dedicated, size-limited thread pool.
+
+    At most ``workers`` hashes run at once and ``queue_size`` more may wait;
+    further calls fail fast with ``HashingOverloaded``. Async callers await
+    ``run_async`` and hold no thread while they wait; ``run`` blocks the
+    calling thread and is meant for code that is not on the event loop.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"completed": 0, "rejected": 0, "wait_seconds": 0.0, "run_seconds": 0.0}
+
+    def _admit(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters["rejected"] += 1
+            raise HashingOverloaded()
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn: Callable, *args):
+        self._admit()
+        try:
+            return self._pool.submit(self._timed, time.perf_counter(), fn, *args).result()
+        finally:
+            self._release()
+
+    async def run_async(self, fn: Callable, *args):
+        self._admit()
+        try:
+            future = self._pool.submit(self._timed, time.perf_counter(), fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the hash finishes, not when the caller stops
+        # waiting, so a cancelled request cannot let the queue overfill.
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, submitted: float, fn: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._counters["completed"] += 1
+                self._counters["wait_seconds"] += started - submitted
+                self._counters["run_seconds"] += finished - started
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            completed = self._counters["completed"]
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "completed": completed,
+                "rejected": self._counters["rejected"],
+                "avg_wait_ms": 1000 * self._counters["wait_seconds"] / completed if completed else 0.0,
+                "avg_run_ms": 1000 * self._counters["run_seconds"] / completed if completed else 0.0,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+
+hashing = HashingExecutor(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    queue_size=int(os.getenv("PASSWORD_HASH_QUEUE", 16)),
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.run(pwd_context.verify, plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a new hash if the stored one is outdated."""
+    return hashing.run(pwd_context.verify_and_update, plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hashing.run(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await hashing.run_async(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing.run_async(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
@@ -38,6 +140,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_access_token(token: str) -> Optional[dict]:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
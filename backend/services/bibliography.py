@@ -0,0 +1,204 @@
+"""Bibliography rendering with an in-process, incrementally updated cache.
+
+A project's reference list is rendered server-side in one of ``STYLES``.
+Rendered entries are cached per project and style for the
+``BIBLIOGRAPHY_CACHE_PROJECTS`` most recently used projects (``0`` disables
+caching). Adding, editing or deleting a reference re-renders only that entry
+in the cached styles of its project, so reopening a manuscript is a cache
+read. Projects are reloaded after ``BIBLIOGRAPHY_CACHE_TTL`` seconds (see
+``services.lru``).
+"""
+
+import os
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .lru import LRUCache
+
+
+def snapshot(ref: models.Reference) -> Dict:
+    """The fields of ``ref`` that the styles read, detached from the session."""
+    return {
+        "id": ref.id,
+        "title": ref.title or "",
+        "authors": ref.authors or "",
+        "journal": ref.journal or "",
+        "year": ref.year or "",
+        "doi": ref.doi or "",
+    }
+
+
+def _authors(ref: Dict) -> List[Tuple[str, str]]:
+    """``(surname, initials)`` pairs of the stored "Surname AB, ..." list."""
+    pairs = []
+    for name in filter(None, (a.strip() for a in ref["authors"].split(","))):
+        surname, _, initials = name.rpartition(" ")
+        pairs.append((surname, initials) if surname and initials.isupper() else (name, ""))
+    return pairs
+
+
+def _sentence(text: str) -> str:
+    text = text.strip()
+    return text if not text or text[-1] in ".?!" else text + "."
+
+
+def _dotted(initials: str) -> str:
+    return " ".join(f"{c}." for c in initials)
+
+
+def vancouver(ref: Dict) -> str:
+    """ICMJE/NLM style: up to six authors, then "et al."."""
+    authors = [f"{s} {i}".strip() for s, i in _authors(ref)]
+    if len(authors) > 6:
+        authors = authors[:6] + ["et al"]
+    parts = [_sentence(", ".join(authors)), _sentence(ref["title"]), _sentence(ref["journal"]), _sentence(ref["year"])]
+    if ref["doi"]:
+        parts.append(f"doi:{ref['doi']}")
+    return " ".join(p for p in parts if p)
+
+
+def apa(ref: Dict) -> str:
+    """APA 7: up to 20 authors, then an ellipsis and the last author."""
+    authors = [f"{s}, {_dotted(i)}" if i else s for s, i in _authors(ref)]
+    if len(authors) > 20:
+        names = ", ".join(authors[:19]) + ", . . . " + authors[-1]
+    elif len(authors) > 1:
+        names = ", ".join(authors[:-1]) + ", & " + authors[-1]
+    else:
+        names = "".join(authors)
+    parts = [names, f"({ref['year'] or 'n.d.'}).", _sentence(ref["title"]), _sentence(ref["journal"])]
+    if ref["doi"]:
+        parts.append(f"https://doi.org/{ref['doi']}")
+    return " ".join(p for p in parts if p)
+
+
+def numeric(ref: Dict) -> str:
+    """IEEE-like: initials first, quoted title, "et al." beyond six authors."""
+    authors = [f"{_dotted(i)} {s}".strip() for s, i in _authors(ref)]
+    head = f"{authors[0]} et al." if len(authors) > 6 else ", ".join(authors)
+    tail = ", ".join(p for p in (ref["journal"], ref["year"]) if p)
+    title = ref["title"].strip().rstrip(".")
+    if title:
+        quoted = f"“{title},” {tail}" if tail else f"“{title}.”"
+        return f"{head}, {quoted}" if head else quoted
+    return _sentence(", ".join(p for p in (head, tail) if p))
+
+
+class Style(NamedTuple):
+    render: Callable[[Dict], str]
+    # Sort key of an entry; numbered styles list references in the order added.
+    order: Callable[[Dict], tuple]
+    label: Callable[[int], str]
+
+
+STYLES: Dict[str, Style] = {
+    "vancouver": Style(vancouver, lambda ref: (ref["id"],), lambda n: f"{n}. "),
+    "apa": Style(
+        apa,
+        lambda ref: (re.sub(r"\W", "", ref["authors"].lower()) or ref["title"].lower(), ref["year"], ref["id"]),
+        lambda n: "",
+    ),
+    "numeric": Style(numeric, lambda ref: (ref["id"],), lambda n: f"[{n}] "),
+}
+
+
+class Rendered(NamedTuple):
+    order: tuple
+    text: str
+
+
+def render_entry(style: str, ref: Dict) -> Rendered:
+    spec = STYLES[style]
+    return Rendered(spec.order(ref), spec.render(ref))
+
+
+def assemble(style: str, entries: Dict[int, Rendered]) -> List[str]:
+    """Sort rendered entries and number them as the style requires."""
+    label = STYLES[style].label
+    ordered = sorted(entries.values())
+    return [(label(n) + entry.text).strip() for n, entry in enumerate(ordered, 1)]
+
+
+class _Project(NamedTuple):
+    owner_id: int
+    # style -> ref id -> rendered entry; replaced, never changed, on a write.
+    styles: Dict[str, Dict[int, Rendered]]
+    # style -> assembled list, filled in on first read.
+    assembled: Dict[str, List[str]]
+
+
+class BibliographyCache:
+    """Rendered entries per project and style, on an ``LRUCache`` of projects."""
+
+    def __init__(self, max_projects: int, ttl: float):
+        self._projects: LRUCache[int, _Project] = LRUCache(max_projects, ttl)
+
+    def generation(self) -> int:
+        return self._projects.generation()
+
+    def get(self, project_id: int, style: str) -> Optional[Tuple[int, List[str]]]:
+        """Return ``(owner_id, entries)`` if the project's style is cached."""
+        project = self._projects.get(project_id)
+        if project is None or style not in project.styles:
+            return None
+        assembled = project.assembled.get(style)
+        if assembled is None:
+            assembled = project.assembled[style] = assemble(style, project.styles[style])
+        return project.owner_id, assembled
+
+    def fill(self, project_id: int, owner_id: int, style: str, refs: List[Dict], generation: int) -> List[str]:
+        """Render a freshly loaded project; cache it unless a write happened since ``generation``."""
+        rendered = {ref["id"]: render_entry(style, ref) for ref in refs}
+        entries = assemble(style, rendered)
+        cached = self._projects.get(project_id)
+        styles, assembled = (cached.styles, cached.assembled) if cached is not None else ({}, {})
+        project = _Project(owner_id, {**styles, style: rendered}, {**assembled, style: entries})
+        self._projects.fill(project_id, project, generation)
+        return entries
+
+    def _update(self, project_id: int, change: Callable[[str, Dict[int, Rendered]], None]) -> None:
+        def apply(project: _Project) -> _Project:
+            styles = {}
+            for style, rendered in project.styles.items():
+                styles[style] = dict(rendered)
+                change(style, styles[style])
+            return _Project(project.owner_id, styles, {})
+
+        self._projects.update(project_id, apply)
+
+    def store(self, project_id: int, ref: Dict) -> None:
+        """Re-render one added or edited reference in every cached style."""
+        def change(style, rendered):
+            rendered[ref["id"]] = render_entry(style, ref)
+
+        self._update(project_id, change)
+
+    def remove(self, project_id: int, ref_id: int) -> None:
+        """Drop one deleted reference from every cached style."""
+        self._update(project_id, lambda style, rendered: rendered.pop(ref_id, None))
+
+    def drop(self, project_id: int) -> None:
+        """Forget a project entirely, e.g. when it is deleted."""
+        self._projects.discard(project_id)
+
+    def clear(self) -> None:
+        self._projects.clear()
+
+
+cache = BibliographyCache(
+    max_projects=int(os.getenv("BIBLIOGRAPHY_CACHE_PROJECTS", "256")),
+    ttl=float(os.getenv("BIBLIOGRAPHY_CACHE_TTL", "300")),
+)
+
+
+async def render(db: AsyncSession, project_id: int, owner_id: int, style: str) -> List[str]:
+    """Return the rendered bibliography of a project the caller has checked it owns."""
+    generation = cache.generation()
+    refs = await db.scalars(
+        select(models.Reference).where(models.Reference.project_id == project_id).order_by(models.Reference.id)
+    )
+    return cache.fill(project_id, owner_id, style, [snapshot(ref) for ref in refs], generation)
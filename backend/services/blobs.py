@@ -0,0 +1,66 @@
+"""Content-addressed storage for uploaded files.
+
+Blobs live on the local filesystem under ``BLOB_DIR`` (default: ``blobs`` next
+to the database) and are keyed by the SHA-256 of their content, so identical
+uploads are stored once. Uploads are streamed to disk in fixed-size chunks and
+database rows only keep the hash and size.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Tuple
+
+from ..db import DB_PATH
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Stores files under ``root/<aa>/<bb>/<sha256>``."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        """Return the on-disk location of a blob."""
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def put(self, fileobj: BinaryIO) -> Tuple[str, int]:
+        """Stream ``fileobj`` into the store and return ``(sha256, size)``."""
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if target.exists():
+                os.unlink(tmp_name)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, target)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return digest, size
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+
+store = BlobStore(Path(os.path.expanduser(os.getenv("BLOB_DIR", str(DB_PATH.parent / "blobs")))))
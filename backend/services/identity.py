@@ -0,0 +1,121 @@
+"""Normalized identity keys used to detect duplicate references.
+
+A reference is identified by its PMID, its DOI and a fingerprint of its title
+and year. Each key is stored in an indexed column next to ``project_id``, so
+checking whether a paper is already in a project costs one index probe per
+key instead of a comparison against every reference.
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+KINDS = ("pmid", "doi", "fingerprint")
+
+_DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_pmid(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip()
+    return (value.lstrip("0") or None) if value.isdigit() else None
+
+
+def normalize_doi(value: Optional[str]) -> Optional[str]:
+    """Lower-case a DOI and strip URL or ``doi:`` prefixes; DOIs are case-insensitive."""
+    value = _DOI_PREFIX.sub("", (value or "").strip()).lower()
+    return value if value.startswith("10.") else None
+
+
+def fingerprint(title: Optional[str], year: Optional[str]) -> Optional[str]:
+    """Hash of the title reduced to lower-case words, plus the year.
+
+    Accents, punctuation, case and spacing are ignored, so the same paper
+    formatted differently by two sources gets the same fingerprint.
+    """
+    text = unicodedata.normalize("NFKD", title or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = _NON_WORD.sub(" ", text.lower()).split()
+    if not words:
+        return None
+    key = " ".join(words) + "|" + (year or "").strip()[:4]
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def keys(fields: Dict) -> Dict[str, Optional[str]]:
+    """Return the identity keys of a reference given its fields."""
+    return {
+        "pmid": normalize_pmid(fields.get("pmid")),
+        "doi": normalize_doi(fields.get("doi")),
+        "fingerprint": fingerprint(fields.get("title"), fields.get("year")),
+    }
+
+
+async def existing(db: AsyncSession, project_id: int, candidates: Iterable[Dict]) -> Dict[Tuple[str, str], int]:
+    """Map ``(kind, key)`` to the id of a reference in the project already using it.
+
+    ``candidates`` are key dicts as returned by ``keys``. All of them are
+    checked with one query.
+    """
+    wanted = {kind: set() for kind in KINDS}
+    for candidate in candidates:
+        for kind in KINDS:
+            if candidate.get(kind):
+                wanted[kind].add(candidate[kind])
+    if not any(wanted.values()):
+        return {}
+    found = {}
+    for kind, key, ref_id in await db.execute(lookup_query(project_id, wanted)):
+        found.setdefault((kind, key), ref_id)
+    return found
+
+
+def lookup_query(project_id: int, wanted: Dict[str, Iterable[str]]):
+    """``(kind, key, ref_id)`` of a project's references having any ``wanted`` key.
+
+    One branch per kind, so that each is answered from its own
+    ``(key, project_id)`` index rather than by scanning the project.
+    """
+    ref = models.Reference
+    branches = [
+        select(literal(kind).label("kind"), getattr(ref, kind).label("key"), ref.id.label("ref_id"))
+        .where(getattr(ref, kind).in_(list(values)), ref.project_id == project_id)
+        for kind, values in wanted.items()
+        if values
+    ]
+    return union_all(*branches).order_by("ref_id")
+
+
+def duplicates_query(user_id: int):
+    """References of a user's projects that share an identity key with another.
+
+    One statement: the keys of all the user's references are grouped to find
+    those used more than once, and joined back to their references. Rows are
+    ``(kind, key, Reference)`` ordered by group.
+    """
+    ref, project = models.Reference, models.Project
+    per_kind = [
+        select(literal(kind).label("kind"), getattr(ref, kind).label("key"), ref.id.label("ref_id"))
+        .join(project, ref.project_id == project.id)
+        .where(project.author_id == user_id, getattr(ref, kind).isnot(None))
+        for kind in KINDS
+    ]
+    keys_ = union_all(*per_kind).cte("identity_keys")
+    shared = (
+        select(keys_.c.kind, keys_.c.key)
+        .group_by(keys_.c.kind, keys_.c.key)
+        .having(func.count() > 1)
+        .subquery("shared")
+    )
+    return (
+        select(keys_.c.kind, keys_.c.key, ref)
+        .join(shared, and_(shared.c.kind == keys_.c.kind, shared.c.key == keys_.c.key))
+        .join(ref, ref.id == keys_.c.ref_id)
+        .order_by(keys_.c.kind, keys_.c.key, ref.id)
+    )
@@ -0,0 +1,115 @@
+"""Thread-safe LRU map with expiring entries.
+
+The in-process caches of the services (settings layers, authenticated
+principals, rendered bibliographies) are built on ``LRUCache``, so expiry and
+eviction live in one place. Entries expire after ``ttl`` seconds, which
+bounds how long another worker process can serve a value written elsewhere,
+and beyond ``max_size`` entries the least recently used are evicted (``0``
+disables the cache).
+
+Values loaded from the database are stored with ``fill``, passing the
+``generation`` read before the load. Every write bumps it, so a load that
+raced a write is dropped instead of caching what the write replaced.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded map of key -> value whose entries expire.
+
+    ``pinned`` keys are never evicted and do not count against ``max_size``.
+    Values are replaced, never changed in place, as callers may still hold
+    the previous one.
+    """
+
+    def __init__(self, max_size: int, ttl: float, pinned: Iterable[K] = ()):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.pinned = frozenset(pinned)
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """Counter bumped by every write; pass it to ``fill``."""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Cache ``value`` for ``ttl`` seconds, at most the cache's own ``ttl``."""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._set(key, value, time.monotonic() + ttl)
+
+    def fill(self, key: K, value: V, generation: int) -> None:
+        """Cache a freshly loaded value unless a write happened since ``generation``.
+
+        A key that is still cached keeps its expiry, so adding to a value
+        does not keep the rest of it alive longer.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            self._set(key, value, entry[0] if entry is not None and entry[0] > now else now + self.ttl)
+
+    def _set(self, key: K, value: V, expires: float) -> None:
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        excess = len(self._entries) - len(self.pinned.intersection(self._entries)) - self.max_size
+        if excess > 0:
+            for oldest in [k for k in self._entries if k not in self.pinned][:excess]:
+                del self._entries[oldest]
+
+    def update(self, key: K, change: Callable[[V], V]) -> None:
+        """Record a write to ``key``, replacing a cached value with ``change(value)``."""
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                self._entries[key] = (expires, change(value))
+
+    def discard(self, key: K) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[V], bool]) -> None:
+        """Drop every entry whose value matches ``predicate``."""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, (_, v) in self._entries.items() if predicate(v)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
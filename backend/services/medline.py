@@ -0,0 +1,165 @@
+"""Streaming import of MEDLINE/PubMed baseline files into the local catalogue.
+
+NLM publishes PubMed as gzipped XML files of ~30,000 articles each. They are
+parsed with ``iterparse`` and every article is cleared from the tree as soon
+as it has been read, so memory use stays flat however large the file is.
+Articles are upserted into ``reference_catalog`` in batches of
+``MEDLINE_BATCH_SIZE``, one transaction per batch, and ``DeleteCitation``
+entries of update files remove articles again.
+
+Run from the repository root::
+
+    python -m backend.services.medline pubmed25n0001.xml.gz [...]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+from xml.etree.ElementTree import iterparse
+
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .references import article_fields
+
+logger = logging.getLogger(__name__)
+
+ARTICLE = "article"
+DELETE = "delete"
+
+
+class ImportStats(NamedTuple):
+    articles: int
+    deleted: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """Articles per second."""
+        return self.articles / self.seconds if self.seconds else 0.0
+
+
+def _batch_size() -> int:
+    return max(1, int(os.getenv("MEDLINE_BATCH_SIZE", "1000")))
+
+
+def _open(path: Union[str, Path]):
+    path = Path(path)
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def iter_records(source) -> Iterator[Tuple[str, Union[dict, List[str]]]]:
+    """Yield ``(ARTICLE, fields)`` per article and ``(DELETE, pmids)`` per deletion.
+
+    ``source`` is a path or binary file object of (uncompressed) PubMed XML.
+    """
+    events = iterparse(source, events=("start", "end"))
+    _, root = next(events)
+    for event, elem in events:
+        if event != "end":
+            continue
+        if elem.tag == "PubmedArticle":
+            pmid = elem.findtext("MedlineCitation/PMID")
+            if pmid:
+                yield ARTICLE, dict(article_fields(elem), pmid=pmid.strip())
+        elif elem.tag == "DeleteCitation":
+            yield DELETE, [p.text.strip() for p in elem.iter("PMID") if p.text]
+        else:
+            continue
+        # Drop everything parsed so far; the root keeps no children around.
+        root.clear()
+
+
+def _upsert(engine: Engine):
+    table = models.CatalogEntry.__table__
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    columns = ("title", "authors", "journal", "year", "doi", "imported_at")
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.pmid], set_={c: stmt.excluded[c] for c in columns}
+    )
+
+
+def import_file(path: Union[str, Path], engine: Engine) -> ImportStats:
+    """Stream one baseline or update file into the catalogue."""
+    upsert = _upsert(engine)
+    batch_size = _batch_size()
+    batch: List[dict] = []
+    articles = deleted = 0
+    start = time.perf_counter()
+
+    def flush():
+        if batch:
+            with engine.begin() as conn:
+                conn.execute(upsert, batch)
+            batch.clear()
+
+    with _open(path) as source:
+        for kind, record in iter_records(source):
+            if kind == ARTICLE:
+                record["imported_at"] = datetime.utcnow()
+                batch.append(record)
+                articles += 1
+                if len(batch) >= batch_size:
+                    flush()
+            else:
+                flush()
+                with engine.begin() as conn:
+                    conn.execute(delete(models.CatalogEntry).where(models.CatalogEntry.pmid.in_(record)))
+                deleted += len(record)
+    flush()
+    stats = ImportStats(articles, deleted, time.perf_counter() - start)
+    logger.info("Imported %d articles from %s (%.0f articles/s)", articles, path, stats.rate)
+    return stats
+
+
+async def catalog_entries(db: AsyncSession, pmids: Iterable[str]) -> Dict[str, dict]:
+    """Return the reference fields of the catalogued articles among ``pmids``."""
+    pmids = list(pmids)
+    entries = {}
+    for i in range(0, len(pmids), 500):
+        rows = await db.scalars(
+            select(models.CatalogEntry).where(models.CatalogEntry.pmid.in_(pmids[i:i + 500]))
+        )
+        for row in rows:
+            entries[row.pmid] = {
+                "title": row.title or "",
+                "authors": row.authors or "",
+                "journal": row.journal or "",
+                "year": row.year or "",
+                "doi": row.doi or "",
+            }
+    return entries
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="MEDLINE/PubMed .xml or .xml.gz files")
+    args = parser.parse_args(argv)
+
+    from .. import migrations
+    from ..db import engine
+
+    migrations.upgrade(engine)
+    total = ImportStats(0, 0, 0.0)
+    for path in args.files:
+        stats = import_file(path, engine)
+        print(f"{path}: {stats.articles} articles, {stats.deleted} deleted, "
+              f"{stats.seconds:.1f} s ({stats.rate:.0f} articles/s)")
+        total = ImportStats(*(a + b for a, b in zip(total, stats)))
+    if len(args.files) > 1:
+        print(f"total: {total.articles} articles in {total.seconds:.1f} s ({total.rate:.0f} articles/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Background PDF text extraction.
+
+PyPDF2 text extraction is CPU-bound, so it runs in worker processes instead
+of on the request thread. Each PDF is split into page ranges of
+``PDF_EXTRACT_PAGES_PER_TASK`` pages which are extracted in parallel; at most
+``PDF_EXTRACT_WORKERS`` worker processes run at once across all documents
+(``0`` extracts in the coordinating thread).
+
+Every task runs in a process of its own document, so a document whose
+extraction, page count included, takes longer than ``PDF_EXTRACT_TIMEOUT``
+seconds can have its processes killed without touching other documents. The
+limit counts from when the document gets its first process, not while it
+waits for one, and the document is marked as failed.
+
+Documents track progress in ``extraction_status``: ``pending`` while queued
+or running, then ``done`` or ``failed``. The extracted text replaces the
+document's only if it was not edited in the meantime; otherwise the edit is
+kept and the pages are just cached.
+
+Extracted text is cached per page in ``pdf_text_pages`` under the PDF's
+SHA-256, so uploading a PDF that was seen before skips PyPDF2 entirely.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import pdf_worker
+from .pdf_worker import extract_range, page_count
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_coordinator: Optional[ThreadPoolExecutor] = None
+
+
+def _workers() -> int:
+    default = min(4, os.cpu_count() or 1)
+    return int(os.getenv("PDF_EXTRACT_WORKERS", str(default)))
+
+
+def _pages_per_task() -> int:
+    return max(1, int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "20")))
+
+
+def _timeout() -> float:
+    return float(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+
+
+def _get_coordinator() -> ThreadPoolExecutor:
+    global _coordinator
+    with _lock:
+        if _coordinator is None:
+            _coordinator = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pdf-extract")
+        return _coordinator
+
+
+def shutdown() -> None:
+    """Stop queued extractions, e.g. on application shutdown.
+
+    Worker processes are daemons and end with the application.
+    """
+    global _coordinator
+    with _lock:
+        if _coordinator is not None:
+            _coordinator.shutdown(wait=False, cancel_futures=True)
+        _coordinator = None
+
+
+class _Slots:
+    """Number of worker processes running, across all documents."""
+
+    def __init__(self):
+        self._used = 0
+        self._changed = threading.Condition()
+
+    def acquire(self) -> None:
+        """Wait until a process may be started."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._used < _workers())
+            self._used += 1
+
+    def try_acquire(self) -> bool:
+        with self._changed:
+            if self._used >= _workers():
+                return False
+            self._used += 1
+            return True
+
+    def release(self, count: int = 1) -> None:
+        with self._changed:
+            self._used -= count
+            self._changed.notify_all()
+
+
+_slots = _Slots()
+
+
+class _Task:
+    """``fn(*args)`` running in a process of its own, which can be killed."""
+
+    def __init__(self, fn: Callable, *args):
+        # Spawned rather than forked so workers never inherit the app's
+        # threads or open database connections.
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe(duplex=False)
+        self.process = context.Process(target=pdf_worker.call, args=(child, fn, args), daemon=True)
+        self.process.start()
+        child.close()
+
+    def result(self):
+        try:
+            ok, value = self.conn.recv()
+        except EOFError:
+            self.process.join()
+            raise RuntimeError(f"PDF extraction worker exited with code {self.process.exitcode}") from None
+        finally:
+            self.conn.close()
+        self.process.join()
+        if not ok:
+            raise value
+        return value
+
+    def kill(self) -> None:
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def _run_tasks(calls: Sequence[Tuple[Callable, tuple]], processes: int, deadline: Optional[float]) -> list:
+    """Run ``calls`` in up to ``processes`` processes at once and return their results.
+
+    Raises ``TimeoutError`` once ``deadline`` (a ``time.monotonic`` value)
+    passes; processes still running then, or when a call fails, are killed.
+    """
+    results = [None] * len(calls)
+    queued = list(enumerate(calls))
+    running = {}
+    try:
+        while queued or running:
+            while queued and len(running) < processes:
+                index, (fn, args) = queued.pop(0)
+                task = _Task(fn, *args)
+                running[task.conn] = (index, task)
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready = wait(list(running), timeout=timeout)
+            if not ready:
+                raise TimeoutError("PDF extraction timed out")
+            for conn in ready:
+                index, task = running.pop(conn)
+                results[index] = task.result()
+    finally:
+        for _, task in running.values():
+            task.kill()
+    return results
+
+
+def _ranges(total: int) -> List[Tuple[int, int]]:
+    step = _pages_per_task()
+    return [(start, min(start + step, total)) for start in range(0, total, step)]
+
+
+def extract_pages(path: str, timeout: Optional[float] = None) -> List[str]:
+    """Extract every page of a PDF, fanning page ranges out over worker processes.
+
+    Raises ``TimeoutError`` if counting the pages and extracting the ranges
+    does not finish within ``timeout`` seconds of the first process starting.
+    """
+    if _workers() <= 0:
+        return [text for start, stop in _ranges(page_count(path)) for text in extract_range(path, start, stop)]
+    _slots.acquire()
+    held = 1
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Opening the PDF is parsing too, so it runs in a worker and counts
+        # against the timeout.
+        [total] = _run_tasks([(page_count, (path,))], held, deadline)
+        ranges = _ranges(total)
+        # More processes only if they are free: waiting for them would count
+        # against the deadline.
+        while held < len(ranges) and _slots.try_acquire():
+            held += 1
+        chunks = _run_tasks([(extract_range, (path, start, stop)) for start, stop in ranges], held, deadline)
+    finally:
+        _slots.release(held)
+    return [text for chunk in chunks for text in chunk]
+
+
+def cached_pages(db: Session, pdf_hash: str) -> Optional[List[str]]:
+    """Return the cached page texts of a PDF, or ``None`` on a miss."""
+    rows = (
+        db.query(models.PdfTextPage.text)
+        .filter(models.PdfTextPage.pdf_hash == pdf_hash)
+        .order_by(models.PdfTextPage.page)
+        .all()
+    )
+    return [row.text for row in rows] if rows else None
+
+
+def store_pages(db: Session, pdf_hash: str, pages: List[str]) -> None:
+    """Cache the page texts of a PDF; a concurrent writer of the same PDF wins."""
+    db.add_all(
+        models.PdfTextPage(pdf_hash=pdf_hash, page=i, text=text)
+        for i, text in enumerate(pages)
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+
+def apply_cached_text(db: Session, doc) -> bool:
+    """Set ``doc.text`` from the cache for its PDF; return whether it was a hit.
+
+    On a miss the document is marked ``pending`` and the caller should
+    ``submit`` it once the change is committed.
+    """
+    pages = cached_pages(db, doc.pdf_hash)
+    if pages is None:
+        doc.extraction_status = PENDING
+        return False
+    doc.text = "\n".join(pages)
+    doc.extraction_status = DONE
+    doc.version = (doc.version or 0) + 1
+    return True
+
+
+def _extract(doc_id: int, path: str) -> Optional[List[str]]:
+    try:
+        return extract_pages(path, _timeout())
+    except Exception:
+        logger.exception("Text extraction failed for document %s", doc_id)
+        return None
+
+
+def _run(doc_id: int, pdf_hash: str, version: int, path: str, session_factory: Callable[[], Session]) -> None:
+    pages = _extract(doc_id, path)
+    status = FAILED if pages is None else DONE
+    document = update(models.Document).where(models.Document.id == doc_id, models.Document.pdf_hash == pdf_hash)
+    db = session_factory()
+    try:
+        if pages:
+            store_pages(db, pdf_hash, pages)
+        # Only apply the text if neither the PDF nor the text has changed
+        # meanwhile; an edit made while extraction ran is kept.
+        applied = 0
+        if pages is not None:
+            applied = db.execute(
+                document.where(models.Document.version == version).values(
+                    extraction_status=status, text="\n".join(pages), version=models.Document.version + 1
+                )
+            ).rowcount
+        if not applied:
+            db.execute(document.values(extraction_status=status))
+        db.commit()
+    finally:
+        db.close()
+
+
+def submit(doc_id: int, pdf_hash: str, version: int, path: str, session_factory: Callable[[], Session]):
+    """Queue extraction of ``path`` into the text of document ``doc_id``.
+
+    The text is only replaced if the document is still at ``version``.
+    """
+    return _get_coordinator().submit(_run, doc_id, pdf_hash, version, path, session_factory)
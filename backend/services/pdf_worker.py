@@ -0,0 +1,32 @@
+"""Code run in PDF extraction worker processes.
+
+Every extraction task starts a fresh process, which imports the module of
+the function it runs; this one is kept free of the app's heavier imports so
+that a worker starts quickly. See ``services.pdf_text``.
+"""
+
+from typing import Callable, List
+
+
+def page_count(path: str) -> int:
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Return the text of pages ``start`` to ``stop - 1``."""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def call(conn, fn: Callable, args: tuple) -> None:
+    """Send ``(True, fn(*args))``, or ``(False, exception)``, over ``conn``."""
+    try:
+        result = (True, fn(*args))
+    except Exception as exc:
+        result = (False, exc)
+    conn.send(result)
+    conn.close()
@@ -0,0 +1,86 @@
+"""In-process cache of authenticated principals.
+
+``get_current_user`` would otherwise verify the JWT and load the user row on
+every request. The cache maps a token to a snapshot of the user's columns and
+hands out session-bound copies via ``Session.merge(load=False)``, which costs
+no SQL.
+
+Entries expire at the token's ``exp`` or after ``AUTH_CACHE_TTL`` seconds,
+whichever comes first, and at most ``AUTH_CACHE_SIZE`` tokens are kept (least
+recently used are evicted; ``0`` disables the cache). Changes to a user must
+call ``invalidate_user``, which reaches only this process's cache; other
+workers pick up the change once the TTL has passed.
+"""
+
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+from .lru import LRUCache
+
+
+class PrincipalCache:
+    """Bounded map of token -> user column values, on an ``LRUCache``."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._entries: LRUCache[str, Dict] = LRUCache(max_size, ttl)
+
+    def get(self, token: str) -> Optional[Dict]:
+        return self._entries.get(token)
+
+    def put(self, token: str, values: Dict, token_exp: float) -> None:
+        # ``exp`` is wall-clock time; the cache counts seconds from now.
+        self._entries.put(token, values, ttl=token_exp - time.time())
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._entries.discard_where(lambda values: values["id"] == user_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+cache = PrincipalCache(
+    max_size=int(os.getenv("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+
+def remember(token: str, user: models.User, token_exp: float) -> None:
+    """Cache a snapshot of ``user`` for ``token``."""
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+    cache.put(token, values, token_exp)
+
+
+def cached_user(token: str) -> Optional[models.User]:
+    """Return a detached copy of the cached user for ``token``, if any.
+
+    Attach it with ``merge(user, load=False)`` on a sync or async session.
+    """
+    values = cache.get(token)
+    if values is None:
+        return None
+    user = models.User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+def lookup(token: str, db: Session) -> Optional[models.User]:
+    """Return the cached user for ``token`` attached to ``db``, without SQL."""
+    user = cached_user(token)
+    return db.merge(user, load=False) if user is not None else None
+
+
+def invalidate_user(user_id: int) -> None:
+    cache.invalidate_user(user_id)
+
+
+@event.listens_for(models.User, "after_delete")
+def _forget_deleted_user(mapper, connection, target):
+    invalidate_user(target.id)
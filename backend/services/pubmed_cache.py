@@ -0,0 +1,120 @@
+"""Persistent cache of PubMed metadata keyed by PMID.
+
+Lookups of a PMID seen before are answered from a local SQLite file
+(``PUBMED_CACHE_PATH``, default ``pubmed_cache.db`` next to the database)
+without network I/O. Entries older than ``PUBMED_CACHE_TTL_DAYS`` are
+revalidated against PubMed on their next use, and still served if PubMed
+cannot be reached. At most ``PUBMED_CACHE_MAX_ENTRIES`` entries are kept; the
+least recently used are evicted first.
+
+The cache is a separate SQLite file rather than a table so that it works the
+same whichever database the app itself uses.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from ..db import DB_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pubmed_metadata (
+    pmid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_pubmed_metadata_accessed ON pubmed_metadata (accessed_at);
+"""
+
+
+class Entry(NamedTuple):
+    data: dict
+    fresh: bool
+
+
+class MetadataCache:
+    """SQLite-backed LRU map of PMID -> reference fields, with a TTL."""
+
+    def __init__(self, path: Path, ttl: float, max_entries: int):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app does not touch the disk.
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, pmids: Iterable[str]) -> Dict[str, Entry]:
+        """Return the cached entries among ``pmids`` and mark them as used."""
+        pmids = list(pmids)
+        now = time.time()
+        rows = []
+        with self._lock:
+            db = self._db()
+            # Stay well below SQLite's limit on bound parameters.
+            for i in range(0, len(pmids), 500):
+                chunk = pmids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows += db.execute(
+                    f"SELECT pmid, data, fetched_at FROM pubmed_metadata WHERE pmid IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                db.execute(
+                    f"UPDATE pubmed_metadata SET accessed_at = ? WHERE pmid IN ({placeholders})",
+                    [now, *chunk],
+                )
+        return {pmid: Entry(json.loads(data), now - fetched < self.ttl) for pmid, data, fetched in rows}
+
+    def get(self, pmid: str) -> Optional[Entry]:
+        return self.get_many([pmid]).get(pmid)
+
+    def put_many(self, articles: Dict[str, dict]) -> None:
+        """Store freshly fetched metadata and evict beyond ``max_entries``."""
+        if not articles or self.max_entries <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO pubmed_metadata (pmid, data, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(pmid, json.dumps(data), now, now) for pmid, data in articles.items()],
+            )
+            db.execute(
+                "DELETE FROM pubmed_metadata WHERE pmid IN ("
+                " SELECT pmid FROM pubmed_metadata ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            db.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT count(*) FROM pubmed_metadata").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+cache = MetadataCache(
+    path=Path(os.getenv("PUBMED_CACHE_PATH") or DB_PATH.parent / "pubmed_cache.db"),
+    ttl=float(os.getenv("PUBMED_CACHE_TTL_DAYS", "30")) * 86400,
+    max_entries=int(os.getenv("PUBMED_CACHE_MAX_ENTRIES", "100000")),
+)
@@ -1,24 +1,35 @@
 """Utility functions for fetching references from PubMed."""
 
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
 from xml.etree import ElementTree
 
-import httpx
+from . import pubmed_cache
 
+logger = logging.getLogger(__name__)
 
-def _parse_pubmed_xml(xml: str) -> dict:
-    """Parse minimal fields from an efetch PubMed XML response."""
-    tree = ElementTree.fromstring(xml)
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+
+# Responses worth retrying: rate limited or a transient server-side failure.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-    article = tree.find(".//PubmedArticle")
-    if article is None:
-        return {}
 
+def article_fields(article) -> dict:
+    """Return the reference fields of one ``<PubmedArticle>`` element."""
     title = article.findtext(".//ArticleTitle", default="")
     year = (
         article.findtext(".//PubDate/Year")
         or article.findtext(".//PubDate/MedlineDate", default="")[:4]
     )
     journal = article.findtext(".//ISOAbbreviation", default="")
+    doi = (
+        article.findtext(".//ArticleIdList/ArticleId[@IdType='doi']")
+        or article.findtext(".//ELocationID[@EIdType='doi']", default="")
+    )
 
     authors = []
     for author in article.findall(".//Author"):
@@ -33,32 +44,212 @@ def _parse_pubmed_xml(xml: str) -> dict:
         "authors": authors_str,
         "journal": journal,
         "year": year,
+        "doi": doi.strip(),
     }
 
 
-def fetch_reference(query: str) -> dict:
-    """Return basic metadata for a PubMed ID or search term."""
-    default_data = {
+def parse_articles(xml: str) -> Dict[str, dict]:
+    """Parse every article of an efetch response, keyed by PMID."""
+    tree = ElementTree.fromstring(xml)
+    articles = {}
+    for article in tree.iter("PubmedArticle"):
+        pmid = article.findtext("MedlineCitation/PMID")
+        if pmid:
+            articles[pmid.strip()] = article_fields(article)
+    return articles
+
+
+class PubMedLookupError(Exception):
+    """Raised when a PMID can be resolved neither from the cache nor PubMed."""
+
+
+class TokenBucket:
+    """Async rate limiter allowing ``rate`` acquisitions per second.
+
+    ``capacity`` bounds bursts; the default of one spaces calls evenly, which
+    keeps any one-second window within ``rate``.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # asyncio locks belong to one event loop; see PubMedClient._http.
+        self._lock = None
+        self._loop = None
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PubMedClient:
+    """Shared E-utilities client: pooled connections, retries, rate limiting.
+
+    One ``httpx.AsyncClient`` keeps connections to NCBI alive between lookups.
+    Requests are limited to NCBI's 3 per second, or 10 with ``NCBI_API_KEY``
+    (``PUBMED_RATE_LIMIT`` overrides), and transport errors, 429 and 5xx
+    responses are retried ``PUBMED_RETRIES`` times with jittered exponential
+    backoff, honouring ``Retry-After`` up to ``PUBMED_MAX_RETRY_AFTER`` seconds
+    (default: the request timeout); a longer wait fails the request instead.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        rate: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: float = 0.5,
+        timeout: Optional[float] = None,
+        max_retry_after: Optional[float] = None,
+    ):
+        self.base_url = (base_url or os.getenv("PUBMED_EUTILS_URL", EUTILS_URL)).rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("NCBI_API_KEY")
+        default_rate = 10 if self.api_key else 3
+        self.limiter = TokenBucket(rate or float(os.getenv("PUBMED_RATE_LIMIT", default_rate)))
+        self.retries = retries if retries is not None else int(os.getenv("PUBMED_RETRIES", "3"))
+        self.backoff = backoff
+        self.timeout = timeout or float(os.getenv("PUBMED_TIMEOUT", "10"))
+        if max_retry_after is None:
+            max_retry_after = float(os.getenv("PUBMED_MAX_RETRY_AFTER", self.timeout))
+        self.max_retry_after = max_retry_after
+        self._client = None
+        self._loop = None
+
+    def _http(self):
+        # httpx connections belong to the event loop that opened them. The app
+        # runs on one loop, but test clients, for example, start one per request.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+            self._loop = loop
+        return self._client
+
+    def _delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    async def get(self, path: str, params: dict) -> str:
+        """GET an E-utilities endpoint and return the body, retrying as configured."""
+        import httpx
+
+        if self.api_key:
+            params = dict(params, api_key=self.api_key)
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            retry_after = None
+            try:
+                resp = await self._http().get(path, params=params)
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    return resp.text
+                retry_after = resp.headers.get("Retry-After")
+                error = httpx.HTTPStatusError(
+                    f"{resp.status_code} from {path}", request=resp.request, response=resp
+                )
+            except httpx.TransportError as exc:
+                error = exc
+            if attempt == self.retries:
+                raise error
+            delay = self._delay(attempt, retry_after)
+            if delay > self.max_retry_after:
+                logger.warning("Not retrying %s: server asked to wait %.0fs", path, delay)
+                raise error
+            logger.info("Retrying %s in %.2fs after %s", path, delay, error)
+            await asyncio.sleep(delay)
+
+    async def efetch(self, ids: List[str]) -> str:
+        """Return the PubMed XML of the given PMIDs."""
+        return await self.get("/efetch.fcgi", {"db": "pubmed", "id": ",".join(ids), "retmode": "xml"})
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+client = PubMedClient()
+
+
+def _batch_size() -> int:
+    return max(1, int(os.getenv("PUBMED_EFETCH_BATCH", "200")))
+
+
+async def fetch_references(pmids: List[str]) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """Fetch many PMIDs with one efetch call per ``PUBMED_EFETCH_BATCH`` IDs.
+
+    Fresh entries of the metadata cache are used without a request; stale
+    ones are refetched but still served if that fails. The cache is SQLite,
+    so it is read and written on a worker thread. Returns
+    ``(found, failed)``: metadata by PMID, and an error message for every
+    PMID that could not be fetched or was not in the response.
+    """
+    import httpx
+
+    cached = await asyncio.to_thread(pubmed_cache.cache.get_many, pmids)
+    found = {pmid: entry.data for pmid, entry in cached.items() if entry.fresh}
+    missing = [pmid for pmid in pmids if pmid not in found]
+    step = _batch_size()
+    chunks = [missing[i:i + step] for i in range(0, len(missing), step)]
+
+    async def fetch(chunk):
+        try:
+            return chunk, parse_articles(await client.efetch(chunk)), None
+        except (httpx.HTTPError, ElementTree.ParseError) as exc:
+            logger.warning("PubMed batch of %d IDs failed", len(chunk), exc_info=True)
+            return chunk, {}, f"PubMed request failed: {exc}"
+
+    results = await asyncio.gather(*(fetch(c) for c in chunks))
+    fetched = {pmid: data for _, articles, _ in results for pmid, data in articles.items()}
+    if fetched:
+        await asyncio.to_thread(pubmed_cache.cache.put_many, fetched)
+    failed = {}
+    for chunk, articles, error in results:
+        for pmid in chunk:
+            if pmid in articles:
+                found[pmid] = articles[pmid]
+            elif pmid in cached:
+                found[pmid] = cached[pmid].data
+            else:
+                failed[pmid] = error or "Not found in PubMed"
+    return found, failed
+
+
+async def fetch_reference(query: str) -> dict:
+    """Return basic metadata for a PubMed ID or search term.
+
+    PMIDs are looked up through the metadata cache like ``fetch_references``;
+    ``PubMedLookupError`` is raised if neither the cache nor PubMed has one.
+    Other queries are taken as the title of a manual reference.
+    """
+    if query.isdigit():
+        found, failed = await fetch_references([query])
+        if query in found:
+            return found[query]
+        raise PubMedLookupError(failed[query])
+
+    return {
         "title": query,
         "authors": "",
         "journal": "",
         "year": "",
     }
-
-    if query.isdigit():
-        url = (
-            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed"
-            f"&id={query}&retmode=xml"
-        )
-        try:
-            resp = httpx.get(url, timeout=10)
-            resp.raise_for_status()
-        except httpx.HTTPError:
-            return default_data
-        data = _parse_pubmed_xml(resp.text)
-        if data:
-            return data
-
-    # fallback to original behaviour for arbitrary queries
-    return default_data
-
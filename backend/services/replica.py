@@ -0,0 +1,69 @@
+"""Routing of read-only requests to the read replica.
+
+GET endpoints that only read use ``AsyncReadSessionLocal``, which is bound to
+the replica when ``DATABASE_REPLICA_URL`` is set. Because the replica lags
+the primary, a client that has just committed a write would not see it
+there: every commit records the request's token, and reads with that token
+stay on the primary for the next ``DB_REPLICA_STICKY_SECONDS`` seconds.
+
+The record is per process, which suffices as long as the sticky window
+exceeds replication lag and a client's requests reach the same worker; with
+several workers it errs towards the replica only after the window has passed
+on each of them.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Session.info key holding the access token of the request using the session.
+TOKEN_KEY = "token"
+
+
+def sticky_seconds() -> float:
+    return float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+
+class RecentWrites:
+    """Tokens that committed a write within the sticky window."""
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._written: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def note(self, token: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._written[token] = now
+            if len(self._written) > self.max_size:
+                cutoff = now - sticky_seconds()
+                self._written = {t: at for t, at in self._written.items() if at > cutoff}
+
+    def recent(self, token: str) -> bool:
+        with self._lock:
+            at = self._written.get(token)
+        return at is not None and time.monotonic() - at < sticky_seconds()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._written.clear()
+
+
+recent_writes = RecentWrites()
+
+
+def use_primary(token: Optional[str]) -> bool:
+    """Whether reads for ``token`` must go to the primary."""
+    return bool(token) and recent_writes.recent(token)
+
+
+@event.listens_for(Session, "after_commit")
+def _note_write(session):
+    token = session.info.get(TOKEN_KEY)
+    if token:
+        recent_writes.note(token)
@@ -0,0 +1,143 @@
+"""Retention policies for document revisions.
+
+Two policies are supported, both optional:
+
+``DOC_HISTORY_LIMIT``
+    keep at most this many revisions per document (``0`` keeps all).
+``DOC_HISTORY_MAX_AGE_DAYS``
+    drop revisions older than this many days (unset or ``0`` keeps all).
+
+By default the policies are enforced on the request path with set-based
+``DELETE`` statements that run in the caller's transaction. Setting
+``DOC_HISTORY_COMPACTION_INTERVAL`` to a number of seconds moves enforcement
+to a background compaction pass instead.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+Revision = models.DocumentRevision
+
+
+def history_limit() -> int:
+    return int(os.getenv("DOC_HISTORY_LIMIT", "20"))
+
+
+def max_age() -> Optional[timedelta]:
+    days = float(os.getenv("DOC_HISTORY_MAX_AGE_DAYS", "0") or 0)
+    return timedelta(days=days) if days > 0 else None
+
+
+def compaction_interval() -> float:
+    return float(os.getenv("DOC_HISTORY_COMPACTION_INTERVAL", "0") or 0)
+
+
+def _execute(db: Session, stmt) -> int:
+    result = db.execute(stmt, execution_options={"synchronize_session": False})
+    return result.rowcount or 0
+
+
+def prune_document(db: Session, document_id: int) -> int:
+    """Apply the retention policies to one document without committing.
+
+    Returns the number of deleted revisions. Pending revisions are flushed
+    first so the statements see them.
+    """
+    db.flush()
+    deleted = 0
+    limit = history_limit()
+    if limit > 0:
+        keep = (
+            select(Revision.id)
+            .where(Revision.document_id == document_id)
+            .order_by(Revision.created_at.desc(), Revision.id.desc())
+            .limit(limit)
+        )
+        deleted += _execute(
+            db,
+            delete(Revision).where(
+                Revision.document_id == document_id,
+                Revision.id.not_in(keep),
+            ),
+        )
+    age = max_age()
+    if age is not None:
+        deleted += _execute(
+            db,
+            delete(Revision).where(
+                Revision.document_id == document_id,
+                Revision.created_at < datetime.utcnow() - age,
+            ),
+        )
+    return deleted
+
+
+def enforce_on_write(db: Session, document_id: int) -> None:
+    """Prune inline unless background compaction is enabled."""
+    if compaction_interval() <= 0:
+        prune_document(db, document_id)
+
+
+def compact(db: Session) -> int:
+    """Apply the retention policies to every document and commit."""
+    deleted = 0
+    limit = history_limit()
+    if limit > 0:
+        ranked = select(
+            Revision.id,
+            func.row_number()
+            .over(
+                partition_by=Revision.document_id,
+                order_by=(Revision.created_at.desc(), Revision.id.desc()),
+            )
+            .label("rank"),
+        ).subquery()
+        surplus = select(ranked.c.id).where(ranked.c.rank > limit)
+        deleted += _execute(db, delete(Revision).where(Revision.id.in_(surplus)))
+    age = max_age()
+    if age is not None:
+        deleted += _execute(
+            db, delete(Revision).where(Revision.created_at < datetime.utcnow() - age)
+        )
+    db.commit()
+    return deleted
+
+
+class Compactor:
+    """Background thread running ``compact`` at a fixed interval."""
+
+    def __init__(self, session_factory: Callable[[], Session], interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="revision-compactor", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = self.session_factory()
+            try:
+                deleted = compact(db)
+                if deleted:
+                    logger.info("Revision compaction removed %d revisions", deleted)
+            except Exception:
+                logger.exception("Revision compaction failed")
+                db.rollback()
+            finally:
+                db.close()
@@ -0,0 +1,158 @@
+"""Delta-compressed storage for document revisions.
+
+Revisions are stored newest-first as a chain of reverse deltas: the newest
+revision of a document always holds its full text, and every older revision
+holds a ``diff_match_patch`` delta that turns the next newer revision back
+into it. Every ``DOC_REVISION_KEYFRAME_INTERVAL``-th revision keeps its full
+text as a keyframe so rebuilding any revision never walks more than one
+interval of deltas.
+
+Autosave bursts can be coalesced: with ``DOC_REVISION_COALESCE_SECONDS`` set,
+an edit by the same user within that many seconds of the latest revision does
+not append a new one. The latest revision already holds the text from before
+the burst, so the history keeps one entry per burst instead of one per save.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from . import retention
+
+
+def _keyframe_interval() -> int:
+    return max(1, int(os.getenv("DOC_REVISION_KEYFRAME_INTERVAL", "10")))
+
+
+def _coalesce_window() -> float:
+    return float(os.getenv("DOC_REVISION_COALESCE_SECONDS", "0") or 0)
+
+
+def make_delta(newer: str, older: str) -> str:
+    """Return a delta that rebuilds ``older`` from ``newer``."""
+    from diff_match_patch import diff_match_patch
+
+    dmp = diff_match_patch()
+    diffs = dmp.diff_main(newer, older)
+    dmp.diff_cleanupEfficiency(diffs)
+    return dmp.diff_toDelta(diffs)
+
+
+def apply_delta(newer: str, delta: str) -> str:
+    """Rebuild the older text from ``newer`` and a delta made by ``make_delta``."""
+    from diff_match_patch import diff_match_patch
+
+    dmp = diff_match_patch()
+    return dmp.diff_text2(dmp.diff_fromDelta(newer, delta))
+
+
+def add_revision(
+    db: Session,
+    doc: models.Document,
+    author_id: Optional[int] = None,
+    coalesce: bool = True,
+) -> models.DocumentRevision:
+    """Store the current text of ``doc`` as its newest revision.
+
+    The previous newest revision is demoted to a reverse delta against the new
+    one unless its sequence number marks it as a keyframe. When ``coalesce`` is
+    set and the previous revision was written by ``author_id`` inside the
+    coalescing window, it is returned unchanged instead. Retention policies
+    run in the same transaction; the caller commits.
+    """
+    text = doc.text or ""
+    prev = (
+        db.query(models.DocumentRevision)
+        .filter(models.DocumentRevision.document_id == doc.id)
+        .order_by(models.DocumentRevision.seq.desc())
+        .first()
+    )
+    window = _coalesce_window()
+    if (
+        coalesce
+        and window > 0
+        and prev is not None
+        and author_id is not None
+        and prev.author_id == author_id
+        and prev.created_at >= datetime.utcnow() - timedelta(seconds=window)
+    ):
+        return prev
+    seq = 1
+    if prev is not None:
+        seq = (prev.seq or 0) + 1
+        if prev.delta is None and prev.seq % _keyframe_interval() != 0:
+            prev.delta = make_delta(text, prev.text or "")
+            prev.text = None
+    rev = models.DocumentRevision(document_id=doc.id, author_id=author_id, seq=seq, text=text)
+    db.add(rev)
+    retention.enforce_on_write(db, doc.id)
+    return rev
+
+
+def _to_read(rev: models.DocumentRevision, text: str) -> schemas.DocumentRevisionRead:
+    return schemas.DocumentRevisionRead(
+        id=rev.id,
+        document_id=rev.document_id,
+        text=text,
+        created_at=rev.created_at,
+    )
+
+
+def list_revisions(db: Session, doc_id: int) -> List[schemas.DocumentRevisionRead]:
+    """Return every revision of a document, oldest first, with full text."""
+    revs = (
+        db.query(models.DocumentRevision)
+        .filter(models.DocumentRevision.document_id == doc_id)
+        .order_by(models.DocumentRevision.seq.desc())
+        .all()
+    )
+    result = []
+    text = ""
+    for rev in revs:
+        text = rev.text if rev.delta is None else apply_delta(text, rev.delta)
+        result.append(_to_read(rev, text))
+    result.reverse()
+    return result
+
+
+def get_revision(db: Session, doc_id: int, rev_id: int) -> Optional[schemas.DocumentRevisionRead]:
+    """Rebuild a single revision from the nearest newer full-text revision."""
+    target = (
+        db.query(models.DocumentRevision)
+        .filter(
+            models.DocumentRevision.id == rev_id,
+            models.DocumentRevision.document_id == doc_id,
+        )
+        .first()
+    )
+    if target is None:
+        return None
+    if target.delta is None:
+        return _to_read(target, target.text)
+    base_seq = (
+        db.query(func.min(models.DocumentRevision.seq))
+        .filter(
+            models.DocumentRevision.document_id == doc_id,
+            models.DocumentRevision.seq > target.seq,
+            models.DocumentRevision.delta.is_(None),
+        )
+        .scalar_subquery()
+    )
+    chain = (
+        db.query(models.DocumentRevision)
+        .filter(
+            models.DocumentRevision.document_id == doc_id,
+            models.DocumentRevision.seq >= target.seq,
+            models.DocumentRevision.seq <= base_seq,
+        )
+        .order_by(models.DocumentRevision.seq.desc())
+        .all()
+    )
+    text = ""
+    for rev in chain:
+        text = rev.text if rev.delta is None else apply_delta(text, rev.delta)
+    return _to_read(target, text)
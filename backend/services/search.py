@@ -0,0 +1,69 @@
+"""Full-text search over the ``search_index`` FTS5 table."""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import schemas
+
+# bm25 weights per column: kind, item_id, project_id, owner_id, title, body, meta
+_WEIGHTS = "0.0, 0.0, 0.0, 0.0, 10.0, 1.0, 3.0"
+
+
+class SearchUnavailable(Exception):
+    """Raised when the database has no FTS5 search index."""
+
+
+def to_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query that matches every term.
+
+    Each term is quoted so user input can never be parsed as FTS5 syntax; the
+    last term also matches as a prefix to support search-as-you-type.
+    """
+    terms = [t for t in re.split(r"\s+", query.strip()) if t]
+    if not terms:
+        return ""
+    quoted = ['"%s"' % t.replace('"', '""') for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search(
+    db: Session,
+    owner_id: int,
+    query: str,
+    project_id: Optional[int] = None,
+    limit: int = 20,
+) -> List[schemas.SearchHit]:
+    """Return the best matches for ``query`` among items owned by ``owner_id``."""
+    if db.get_bind().dialect.name != "sqlite":
+        raise SearchUnavailable()
+    match = to_match_query(query)
+    if not match:
+        return []
+    sql = f"""
+        SELECT kind, item_id, project_id, title,
+               snippet(search_index, -1, '<b>', '</b>', '…', 12) AS snippet,
+               bm25(search_index, {_WEIGHTS}) AS rank
+        FROM search_index
+        WHERE search_index MATCH :match AND owner_id = :owner_id
+    """
+    params = {"match": match, "owner_id": owner_id, "limit": limit}
+    if project_id is not None:
+        sql += " AND project_id = :project_id"
+        params["project_id"] = project_id
+    sql += " ORDER BY rank LIMIT :limit"
+    rows = db.execute(text(sql), params).mappings()
+    return [
+        schemas.SearchHit(
+            kind=row["kind"],
+            id=row["item_id"],
+            project_id=row["project_id"],
+            title=row["title"],
+            snippet=row["snippet"],
+            rank=row["rank"],
+        )
+        for row in rows
+    ]
@@ -0,0 +1,91 @@
+"""Settings resolution with an in-process, write-through cache.
+
+A user's effective settings are the global settings (``user_id`` NULL) with
+the user's own settings merged over them. Both layers are loaded whole, one
+query each, and cached: the global layer once, per-user layers for the
+``SETTINGS_CACHE_USERS`` most recently used users (``0`` disables caching).
+``set_setting`` writes new values through to the cache; layers are reloaded
+after ``SETTINGS_CACHE_TTL`` seconds (see ``services.lru``).
+"""
+
+import os
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .lru import LRUCache
+
+# Layer key of the global settings.
+GLOBAL = None
+
+
+def snapshot(setting: models.Setting) -> Dict:
+    """Plain copy of a setting row, safe to share between sessions."""
+    return {"id": setting.id, "key": setting.key, "value": setting.value, "user_id": setting.user_id}
+
+
+class SettingsCache:
+    """Settings layers by user id (or ``GLOBAL``): {key: setting snapshot}.
+
+    The global layer, read by every lookup, is pinned rather than counted
+    against ``max_users``.
+    """
+
+    def __init__(self, max_users: int, ttl: float):
+        self._layers: LRUCache[Optional[int], Dict[str, Dict]] = LRUCache(max_users, ttl, pinned=[GLOBAL])
+
+    def generation(self) -> int:
+        return self._layers.generation()
+
+    def layer(self, user_id: Optional[int]) -> Optional[Dict[str, Dict]]:
+        return self._layers.get(user_id)
+
+    def fill(self, user_id: Optional[int], values: Dict[str, Dict], generation: int) -> None:
+        self._layers.fill(user_id, values, generation)
+
+    def store(self, setting: Dict) -> None:
+        """Write a committed setting through to its layer, if cached."""
+        self._layers.update(setting["user_id"], lambda values: {**values, setting["key"]: setting})
+
+    def clear(self) -> None:
+        self._layers.clear()
+
+
+cache = SettingsCache(
+    max_users=int(os.getenv("SETTINGS_CACHE_USERS", "1024")),
+    ttl=float(os.getenv("SETTINGS_CACHE_TTL", "60")),
+)
+
+
+async def layer(db: AsyncSession, user_id: Optional[int]) -> Dict[str, Dict]:
+    """Return all settings of ``user_id`` (or the global ones) by key."""
+    values = cache.layer(user_id)
+    if values is not None:
+        return values
+    generation = cache.generation()
+    query = select(models.Setting)
+    if user_id is GLOBAL:
+        query = query.where(models.Setting.user_id.is_(None))
+    else:
+        query = query.where(models.Setting.user_id == user_id)
+    values = {row.key: snapshot(row) for row in (await db.scalars(query)).all()}
+    cache.fill(user_id, values, generation)
+    return values
+
+
+async def resolve(
+    db: AsyncSession, user_id: Optional[int], keys: Optional[Iterable[str]] = None
+) -> Dict[str, Dict]:
+    """Return the effective settings of a user (or only globals), by key.
+
+    User values override globals. With ``keys`` only those are returned;
+    unknown keys are left out.
+    """
+    merged = dict(await layer(db, GLOBAL))
+    if user_id is not None:
+        merged.update(await layer(db, user_id))
+    if keys is not None:
+        merged = {key: merged[key] for key in keys if key in merged}
+    return merged
@@ -0,0 +1,101 @@
+"""Compare time to first token of ``POST /ai/mcp`` and ``/ai/mcp/stream``.
+
+Both endpoints are driven over raw ASGI with the stub backend pausing
+``AI_STUB_TOKEN_DELAY`` seconds per token (default 20 ms) to behave like a
+remote model. For each, ``BENCH_REQUESTS`` requests with a prompt of
+``BENCH_PROMPT_WORDS`` words run ``BENCH_CONCURRENCY`` at a time. The run
+reports p50/p95 of the time to the first token separately from the total
+latency. The JSON endpoint cannot show anything before the whole reply
+exists, so for it both numbers are the same.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_ai_stream
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_DIR", tempfile.mkdtemp(prefix="bench-ai-"))
+os.environ.setdefault("AI_STUB_TOKEN_DELAY", "0.02")
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from backend.main import app  # noqa: E402
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "50"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "10"))
+PROMPT = " ".join(f"word{i}" for i in range(int(os.getenv("BENCH_PROMPT_WORDS", "50"))))
+
+
+async def _request(path: str, token_marker: bytes):
+    """Return ``(time to first token, total)`` of one request, in seconds."""
+    body = json.dumps({"prompt": PROMPT}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    sent = False
+    finished = asyncio.Event()
+    first = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first
+        if message["type"] == "http.response.body":
+            if first is None and token_marker in message.get("body", b""):
+                first = time.perf_counter()
+            if not message.get("more_body"):
+                finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    end = time.perf_counter()
+    return (first or end) - start, end - start
+
+
+async def _run(path: str, token_marker: bytes):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            return await _request(path, token_marker)
+
+    return await asyncio.gather(*(one() for _ in range(REQUESTS)))
+
+
+def _report(name: str, samples) -> None:
+    def pct(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+    ttft = [s[0] for s in samples]
+    total = [s[1] for s in samples]
+    print(
+        f"{name:12} first token p50 {pct(ttft, 50):8.1f} ms  p95 {pct(ttft, 95):8.1f} ms   "
+        f"total p50 {pct(total, 50):8.1f} ms  p95 {pct(total, 95):8.1f} ms"
+    )
+
+
+async def main() -> None:
+    await _run("/ai/mcp", b"response")  # warm up
+    print(f"{REQUESTS} requests, {CONCURRENCY} concurrent, {len(PROMPT.split()) + 3} tokens, "
+          f"{float(os.environ['AI_STUB_TOKEN_DELAY']) * 1000:.0f} ms per token")
+    _report("/mcp", await _run("/ai/mcp", b"response"))
+    _report("/mcp/stream", await _run("/ai/mcp/stream", b'"token"'))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
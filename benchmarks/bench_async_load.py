@@ -0,0 +1,128 @@
+"""Compare the async document read path with the former sync handler.
+
+Serves ``GET /documents/{id}`` (async, aiosqlite) next to a copy of the
+previous sync handler and fires ``BENCH_REQUESTS`` requests at each with
+``BENCH_CONCURRENCY`` in flight, reporting throughput and p50/p99 latency.
+
+``BENCH_QUERY_LATENCY_MS`` adds a fixed delay to every SQL statement on both
+engines to model a database that is not on local disk; with ``0`` the numbers
+mostly measure framework overhead.
+
+Keep ``BENCH_CONCURRENCY`` below the 40 threads of Starlette's threadpool: past
+that the sync handler's session cleanup queues behind requests waiting for a
+pooled connection and stalls until the pool timeout.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_async_load
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_DIR", tempfile.mkdtemp(prefix="bench-async-"))
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import httpx  # noqa: E402
+from fastapi import Depends, HTTPException, Request, Response  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend import migrations, models, schemas  # noqa: E402
+from backend.api import etag  # noqa: E402
+from backend.api.documents import READ_COLUMNS  # noqa: E402
+from backend.api.users import get_current_user, get_db  # noqa: E402
+from backend.db import async_engine, engine  # noqa: E402
+from backend.main import app  # noqa: E402
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "32"))
+QUERY_LATENCY = float(os.getenv("BENCH_QUERY_LATENCY_MS", "2")) / 1000
+
+
+@app.get("/bench/sync/{doc_id}", response_model=schemas.DocumentRead)
+def read_document_sync(
+    doc_id: int,
+    token: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    """The document read handler as it was before the async port."""
+    user = get_current_user(token, db)
+    stamp = (
+        db.query(models.Document.version, models.Document.updated_at)
+        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
+        .first()
+    )
+    if not stamp:
+        raise HTTPException(status_code=404, detail="Document not found")
+    cached = etag.check(request, response, etag.make_etag("document", doc_id, tuple(stamp)))
+    if cached:
+        return cached
+    return (
+        db.query(models.Document)
+        .options(READ_COLUMNS)
+        .filter(models.Document.id == doc_id, models.Document.creator_id == user.id)
+        .first()
+    )
+
+
+def _add_latency(target_engine) -> None:
+    # The delay runs in SQLite's trace callback, i.e. on the thread executing
+    # the statement (aiosqlite's worker thread for the async engine), so it
+    # blocks like network I/O would instead of stalling the event loop.
+    @event.listens_for(target_engine, "connect")
+    def on_connect(dbapi_connection, record):
+        raw = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        raw = getattr(raw, "_conn", raw)
+        raw.set_trace_callback(lambda statement: time.sleep(QUERY_LATENCY))
+
+
+async def _run(client: httpx.AsyncClient, url: str, token: str):
+    latencies = []
+    queue = iter(range(REQUESTS))
+
+    async def worker():
+        for _ in queue:
+            start = time.perf_counter()
+            resp = await client.get(url, params={"token": token})
+            latencies.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def _report(name: str, elapsed: float, latencies) -> None:
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:6} {REQUESTS / elapsed:10.0f} req/s   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def main() -> None:
+    migrations.upgrade()
+    if QUERY_LATENCY:
+        _add_latency(engine)
+        _add_latency(async_engine.sync_engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        creds = {"username": "bench", "password": "bench"}
+        await client.post("/auth/register", json=creds)
+        token = (await client.post("/auth/login", json=creds)).json()["access_token"]
+        doc = await client.post("/documents/", params={"token": token, "text": "x" * 2000})
+        doc_id = doc.json()["id"]
+
+        print(f"{REQUESTS} requests, {CONCURRENCY} concurrent, "
+              f"{QUERY_LATENCY * 1000:.1f} ms per statement")
+        _report("sync", *await _run(client, f"/bench/sync/{doc_id}", token))
+        _report("async", *await _run(client, f"/documents/{doc_id}", token))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
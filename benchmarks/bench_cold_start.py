@@ -0,0 +1,114 @@
+"""Measure cold start: import time, startup and time to first request.
+
+Each run starts a fresh interpreter that imports ``backend.main``, runs the
+ASGI lifespan startup (migrations, admin seeding) and serves one request that
+reads from the database. Requests are driven over raw ASGI so no HTTP client
+library is imported. Runs alternate between an empty database directory and
+the one left behind by the previous run.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_cold_start
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import asyncio, json, sys, time
+
+start = time.perf_counter()
+from backend.main import app
+imported = time.perf_counter()
+
+
+async def lifespan_startup():
+    events = asyncio.Queue()
+    await events.put({"type": "lifespan.startup"})
+    done = asyncio.Event()
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup"):
+            done.set()
+
+    task = asyncio.ensure_future(app({"type": "lifespan", "asgi": {"version": "3.0"}}, events.get, send))
+    await done.wait()
+    return task
+
+
+async def get(path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+
+async def main():
+    await lifespan_startup()
+    started = time.perf_counter()
+    status = await get("/settings/cold-start")
+    served = time.perf_counter()
+    heavy = [m for m in ("PyPDF2", "diff_match_patch", "httpx", "jose") if m in sys.modules]
+    print(json.dumps({
+        "import": imported - start,
+        "startup": started - imported,
+        "first_request": served - started,
+        "status": status,
+        "heavy": heavy,
+    }))
+
+
+asyncio.run(main())
+"""
+
+
+def _run(db_dir: str) -> dict:
+    env = dict(os.environ, DB_DIR=db_dir, ADMIN_USERNAME="admin", ADMIN_PASSWORD="admin")
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _report(name: str, results) -> None:
+    def ms(key):
+        return statistics.median(r[key] for r in results) * 1000
+
+    print(f"{name:15} import {ms('import'):8.1f} ms   startup {ms('startup'):8.1f} ms   "
+          f"first request {ms('first_request'):7.1f} ms")
+
+
+def main() -> None:
+    cold, warm = [], []
+    for _ in range(RUNS):
+        db_dir = tempfile.mkdtemp(prefix="bench-cold-")
+        cold.append(_run(db_dir))
+        warm.append(_run(db_dir))
+    print(f"median of {RUNS} runs")
+    _report("empty database", cold)
+    _report("existing", warm)
+    heavy = sorted({m for r in cold + warm for m in r["heavy"]})
+    print(f"heavy modules imported: {', '.join(heavy) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare delta-compressed revision storage with full-copy revisions.
+
+Simulates an editing session on a ~200 KB manuscript and reports the bytes
+stored for ``DOC_HISTORY_LIMIT`` revisions plus the latency of rebuilding the
+history and a single old revision.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_revisions
+"""
+
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from backend import models  # noqa: E402
+from backend.db import Base  # noqa: E402
+from backend.services import revisions  # noqa: E402
+
+DOC_SIZE = 200_000
+EDITS = int(os.getenv("DOC_HISTORY_LIMIT", "20"))
+REPEAT = 20
+
+
+def _manuscript(rng: random.Random) -> str:
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "cohort", "patients", "results"]
+    out = []
+    size = 0
+    while size < DOC_SIZE:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+
+def _edit(text: str, rng: random.Random) -> str:
+    pos = rng.randrange(len(text))
+    return text[:pos] + " revised sentence number %d." % rng.randrange(10**6) + text[pos + 40:]
+
+
+def main() -> None:
+    rng = random.Random(42)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    doc = models.Document(text=_manuscript(rng))
+    db.add(doc)
+    db.commit()
+
+    full_bytes = 0
+    for _ in range(EDITS):
+        full_bytes += len(doc.text)
+        revisions.add_revision(db, doc)
+        doc.text = _edit(doc.text, rng)
+        db.commit()
+
+    delta_bytes = db.query(
+        func.sum(
+            func.coalesce(func.length(models.DocumentRevision.text), 0)
+            + func.coalesce(func.length(models.DocumentRevision.delta), 0)
+        )
+    ).scalar()
+
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        history = revisions.list_revisions(db, doc.id)
+    list_ms = (time.perf_counter() - start) / REPEAT * 1000
+
+    oldest = history[0].id
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        revisions.get_revision(db, doc.id, oldest)
+    get_ms = (time.perf_counter() - start) / REPEAT * 1000
+
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        db.query(models.DocumentRevision.text).filter(
+            models.DocumentRevision.document_id == doc.id
+        ).all()
+    full_list_ms = (time.perf_counter() - start) / REPEAT * 1000
+
+    print(f"revisions:               {EDITS} of ~{DOC_SIZE // 1000} KB")
+    print(f"full-copy storage:       {full_bytes / 1024:10.1f} KB")
+    print(f"delta storage:           {delta_bytes / 1024:10.1f} KB "
+          f"({full_bytes / delta_bytes:.1f}x smaller)")
+    print(f"list history (full):     {full_list_ms:10.2f} ms")
+    print(f"list history (delta):    {list_ms:10.2f} ms")
+    print(f"rebuild oldest (delta):  {get_ms:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sys, os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# The database and blob store are located when ``backend`` is imported, so
+# point them away from the checkout first.
+DATA_DIR = tempfile.mkdtemp(prefix="writedarker-tests-")
+os.environ["DB_DIR"] = DATA_DIR
+os.environ["BLOB_DIR"] = os.path.join(DATA_DIR, "blobs")
+
+import pytest
+
+from backend import migrations
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    """Bring the test database up to date; the app no longer does so on import."""
+    migrations.upgrade()
+    yield
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+class PubMedStub:
+    """Local stand-in for NCBI's efetch endpoint.
+
+    ``articles`` maps PMIDs to ``<PubmedArticle>`` XML; ``failures`` lists
+    status codes to answer with, in order, before serving normally, sending
+    ``retry_after`` as ``Retry-After`` if set.
+    """
+
+    def __init__(self):
+        self.articles = {}
+        self.failures = []
+        self.retry_after = None
+        self.requests = []
+
+    def efetch(self, params):
+        ids = params.get("id", [""])[0].split(",")
+        body = "".join(self.articles[i] for i in ids if i in self.articles)
+        return f"<?xml version='1.0' encoding='UTF-8'?>\n<PubmedArticleSet>{body}</PubmedArticleSet>"
+
+
+@pytest.fixture
+def pubmed(monkeypatch, tmp_path):
+    """Point the PubMed client at a local ``PubMedStub`` server.
+
+    The metadata cache starts empty in ``tmp_path``.
+    """
+    from backend.services import pubmed_cache, references
+
+    stub = PubMedStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            stub.requests.append((time.monotonic(), self.client_address, url.path, params))
+            if stub.failures:
+                status, body = stub.failures.pop(0), b"unavailable"
+            else:
+                status, body = 200, stub.efetch(params).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/xml")
+            if status != 200 and stub.retry_after:
+                self.send_header("Retry-After", stub.retry_after)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(
+        references, "client", references.PubMedClient(base_url=url, api_key="", rate=1000, backoff=0.01)
+    )
+    metadata = pubmed_cache.MetadataCache(tmp_path / "pubmed_cache.db", ttl=3600, max_entries=100)
+    monkeypatch.setattr(pubmed_cache, "cache", metadata)
+    try:
+        yield stub
+    finally:
+        server.shutdown()
+        server.server_close()
+        metadata.close()
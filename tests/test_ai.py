@@ -1,7 +1,11 @@
 import sys, os
+import asyncio
+import json
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
+from backend.services import ai
 
 client = TestClient(app)
 
@@ -12,3 +16,48 @@ def test_mcp_endpoint_returns_mock_response():
     assert "response" in data
     assert isinstance(data["response"], str)
     assert "hello" in data["response"]
+
+
+def sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_mcp_stream_sends_tokens_then_the_full_reply():
+    with client.stream("POST", "/ai/mcp/stream", json={"prompt": "hello  world"}) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = sse_events(resp.read().decode())
+
+    tokens = [data["token"] for kind, data in events if kind == "message"]
+    assert len(tokens) == 5
+    assert events[-1] == ("done", {"response": "".join(tokens)})
+    assert events[-1][1]["response"] == client.post("/ai/mcp", json={"prompt": "hello  world"}).json()["response"]
+
+
+def test_backend_is_pluggable(monkeypatch):
+    class Failing(ai.AIBackend):
+        async def stream(self, prompt):
+            yield "partial "
+            raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(ai, "_backend", Failing())
+    events = sse_events(client.post("/ai/mcp/stream", json={"prompt": "x"}).text)
+    assert events == [("message", {"token": "partial "}), ("error", {"detail": "AI backend failed"})]
+
+    monkeypatch.setattr(ai, "_backend", None)
+    monkeypatch.setenv("AI_BACKEND", "backend.services.ai:StubBackend")
+    assert isinstance(ai.get_backend(), ai.StubBackend)
+    assert asyncio.run(ai.StubBackend().complete("")) == "MCP mock reply: ..."
+
+
+def test_backend_without_stream_cannot_be_built():
+    class Incomplete(ai.AIBackend):
+        async def complete(self, prompt):
+            return prompt
+
+    with pytest.raises(TypeError, match="stream"):
+        Incomplete()
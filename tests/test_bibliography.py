@@ -0,0 +1,115 @@
+import sys, os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from backend.db import async_engine
+from backend.main import app
+from backend.services import bibliography
+
+client = TestClient(app)
+
+REF = {
+    "id": 1,
+    "title": "Persistent cognitive slowing in post-COVID patients.",
+    "authors": "Martin EM, Srowig A, Utech I, Schrenk S, Kattlun F, Radscheidt M, Finke K",
+    "journal": "J Neurol",
+    "year": "2024",
+    "doi": "10.1007/s00415-023-12069-4",
+}
+
+
+def get_token():
+    username = f"bib_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def entries(token, project_id, style="vancouver"):
+    resp = client.get(
+        f"/references/project/{project_id}/bibliography", params={"token": token, "style": style}
+    )
+    assert resp.status_code == 200
+    return resp.json()["entries"]
+
+
+def test_styles():
+    assert bibliography.vancouver(REF) == (
+        "Martin EM, Srowig A, Utech I, Schrenk S, Kattlun F, Radscheidt M, et al. "
+        "Persistent cognitive slowing in post-COVID patients. J Neurol. 2024. doi:10.1007/s00415-023-12069-4"
+    )
+    assert bibliography.apa(dict(REF, authors="Martin EM, Finke K")) == (
+        "Martin, E. M., & Finke, K. (2024). Persistent cognitive slowing in post-COVID patients. "
+        "J Neurol. https://doi.org/10.1007/s00415-023-12069-4"
+    )
+    assert bibliography.numeric(REF) == (
+        "E. M. Martin et al., “Persistent cognitive slowing in post-COVID patients,” J Neurol, 2024"
+    )
+    assert bibliography.apa(dict(REF, authors="", year="", doi="")) == (
+        "(n.d.). Persistent cognitive slowing in post-COVID patients. J Neurol."
+    )
+
+
+def test_numbering_and_order_follow_the_style():
+    rendered = {
+        ref["id"]: ref
+        for ref in (
+            dict(REF, id=1, authors="Zed A", title="Later"),
+            dict(REF, id=2, authors="Abel B", title="Earlier"),
+        )
+    }
+    vancouver = bibliography.assemble("vancouver", {i: bibliography.render_entry("vancouver", r) for i, r in rendered.items()})
+    apa = bibliography.assemble("apa", {i: bibliography.render_entry("apa", r) for i, r in rendered.items()})
+    assert [e[:6] for e in vancouver] == ["1. Zed", "2. Abe"]
+    assert [e[:4] for e in apa] == ["Abel", "Zed,"]
+
+
+def test_bibliography_is_cached_and_updated_incrementally():
+    token = get_token()
+    project_id = client.post("/projects/", params={"token": token}, json={"label": "Bib"}).json()["id"]
+    ids = [
+        client.post("/references/", params={"token": token}, data={"project_id": project_id, "query": title}).json()["id"]
+        for title in ("First paper", "Second paper")
+    ]
+    assert entries(token, project_id) == ["1. First paper.", "2. Second paper."]
+    assert entries(token, project_id, "numeric") == ["[1] “First paper.”", "[2] “Second paper.”"]
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        assert entries(token, project_id) == ["1. First paper.", "2. Second paper."]
+        assert statements == []
+
+        client.put(f"/references/{ids[0]}", params={"token": token}, json={"authors": "Doe J", "year": "2020"})
+        client.post("/references/", params={"token": token}, data={"project_id": project_id, "query": "Third paper"})
+        client.delete(f"/references/{ids[1]}", params={"token": token})
+        del statements[:]
+        assert entries(token, project_id) == ["1. Doe J. First paper. 2020.", "2. Third paper."]
+        assert entries(token, project_id, "numeric") == ["[1] J. Doe, “First paper,” 2020", "[2] “Third paper.”"]
+        assert statements == []
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+
+    assert client.get(
+        f"/references/project/{project_id}/bibliography", params={"token": get_token()}
+    ).status_code == 404
+    assert client.get(
+        f"/references/project/{project_id}/bibliography", params={"token": token, "style": "chicago"}
+    ).status_code == 400
+
+
+def test_stale_fill_is_discarded_after_a_write():
+    cache = bibliography.BibliographyCache(max_projects=1, ttl=60)
+    generation = cache.generation()
+    cache.store(1, dict(REF, title="New"))
+    cache.fill(1, 7, "apa", [dict(REF, title="Old")], generation)
+    assert cache.get(1, "apa") is None
+
+    cache.fill(1, 7, "apa", [REF], cache.generation())
+    assert cache.get(1, "apa")[0] == 7
+    cache.fill(2, 7, "apa", [REF], cache.generation())
+    assert cache.get(1, "apa") is None
@@ -1,15 +1,56 @@
 import sys, os
 import io
+import hashlib
+import multiprocessing
+import threading
+import time
 import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+import pytest
 from fastapi.testclient import TestClient
 from PyPDF2 import PdfWriter
+from diff_match_patch import diff_match_patch
+from sqlalchemy import event, inspect
 from backend.main import app
+from backend import models
+from backend.db import SessionLocal, async_engine
+from backend.services import blobs, pdf_text, retention
 
 client = TestClient(app)
 
 
+def make_text_pdf(pages):
+    """Build a minimal PDF with one line of text per page."""
+    objs = []
+    n = len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n))
+    font_id = 3 + 2 * n
+    objs.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {n} >>")
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 10 50 Td ({text}) Tj ET"
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 100] "
+            f"/Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objs.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
 def get_token():
     username = f"bob_{uuid.uuid4().hex[:6]}"
     client.post(
@@ -80,3 +121,341 @@ def test_revision_history_and_restore():
     rev_resp2 = client.get(f"/documents/{doc_id}/revisions", params={"token": token})
     assert rev_resp2.status_code == 200
     assert len(rev_resp2.json()) == 3
+
+
+def test_revisions_rebuilt_from_deltas():
+    token = get_token()
+    base = "The quick brown fox jumps over the lazy dog. " * 50
+    resp = client.post("/documents/", params={"token": token, "text": base + "0"})
+    doc_id = resp.json()["id"]
+    versions = [base + "0"]
+    for i in range(1, 15):
+        text = base + str(i)
+        resp = client.put(f"/documents/{doc_id}", params={"token": token}, json={"text": text})
+        assert resp.status_code == 200
+        versions.append(text)
+
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == versions[:-1]
+
+    restore_resp = client.post(
+        f"/documents/{doc_id}/restore/{revs[2]['id']}", params={"token": token}
+    )
+    assert restore_resp.status_code == 200
+    assert restore_resp.json()["text"] == versions[2]
+
+
+def _put_versions(token, doc_id, count):
+    for i in range(count):
+        resp = client.put(f"/documents/{doc_id}", params={"token": token}, json={"text": f"v{i}"})
+        assert resp.status_code == 200
+
+
+def test_revision_limit_pruned_inline(monkeypatch):
+    monkeypatch.setenv("DOC_HISTORY_LIMIT", "3")
+    token = get_token()
+    doc_id = client.post("/documents/", params={"token": token, "text": "start"}).json()["id"]
+    _put_versions(token, doc_id, 6)
+
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == ["v2", "v3", "v4"]
+
+
+def test_background_compaction_applies_count_and_age(monkeypatch):
+    monkeypatch.setenv("DOC_HISTORY_COMPACTION_INTERVAL", "3600")
+    monkeypatch.setenv("DOC_HISTORY_LIMIT", "4")
+    token = get_token()
+    doc_id = client.post("/documents/", params={"token": token, "text": "start"}).json()["id"]
+    _put_versions(token, doc_id, 6)
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert len(revs) == 6
+
+    db = SessionLocal()
+    try:
+        retention.compact(db)
+        revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+        assert [r["text"] for r in revs] == ["v1", "v2", "v3", "v4"]
+
+        oldest = db.get(models.DocumentRevision, revs[0]["id"])
+        oldest.created_at = datetime.utcnow() - timedelta(days=30)
+        db.commit()
+        monkeypatch.setenv("DOC_HISTORY_MAX_AGE_DAYS", "7")
+        retention.compact(db)
+    finally:
+        db.close()
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == ["v2", "v3", "v4"]
+
+
+def test_autosave_burst_coalesced_into_one_revision(monkeypatch):
+    monkeypatch.setenv("DOC_REVISION_COALESCE_SECONDS", "60")
+    token = get_token()
+    doc_id = client.post("/documents/", params={"token": token, "text": "draft"}).json()["id"]
+    _put_versions(token, doc_id, 5)
+
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == ["draft"]
+
+    restore_resp = client.post(
+        f"/documents/{doc_id}/restore/{revs[0]['id']}", params={"token": token}
+    )
+    assert restore_resp.json()["text"] == "draft"
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == ["draft", "v4"]
+
+
+def test_pdf_and_image_stored_once_by_hash():
+    token = get_token()
+    pdf_buf = io.BytesIO()
+    writer = PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    writer.write(pdf_buf)
+    pdf_bytes = pdf_buf.getvalue()
+
+    ids = []
+    for _ in range(2):
+        files = {"pdf": ("same.pdf", io.BytesIO(pdf_bytes), "application/pdf")}
+        resp = client.post("/documents/", params={"token": token}, files=files)
+        assert resp.status_code == 200
+        ids.append(resp.json()["id"])
+    image_resp = client.post(
+        f"/documents/{ids[0]}/image",
+        params={"token": token},
+        files={"image": ("pic.png", io.BytesIO(b"\x89PNG fake"), "image/png")},
+    )
+    assert image_resp.status_code == 200
+
+    db = SessionLocal()
+    try:
+        first, second = (db.get(models.Document, i) for i in ids)
+        assert first.pdf_hash == second.pdf_hash
+        assert first.pdf_size == len(pdf_bytes)
+        assert first.image_size == len(b"\x89PNG fake")
+    finally:
+        db.close()
+    path = blobs.store.path(first.pdf_hash)
+    assert path.read_bytes() == pdf_bytes
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_blob_store_streams_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "CHUNK_SIZE", 4)
+    store = blobs.BlobStore(tmp_path)
+    digest, size = store.put(io.BytesIO(b"0123456789"))
+    assert size == 10
+    assert store.path(digest).read_bytes() == b"0123456789"
+    assert list(store.tmp_dir.iterdir()) == []
+
+
+@contextmanager
+def track_loads():
+    """Count SQL statements and bytes of Document attributes loaded."""
+    stats = {"statements": 0, "bytes": 0}
+
+    def on_execute(*args):
+        stats["statements"] += 1
+
+    def on_load(target, context):
+        stats["bytes"] += sum(
+            len(v) for v in inspect(target).dict.values() if isinstance(v, (str, bytes))
+        )
+
+    # The document routers run on the async engine.
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(models.Document, "load", on_load)
+    try:
+        yield stats
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        event.remove(models.Document, "load", on_load)
+
+
+def test_project_listing_loads_no_unneeded_columns():
+    token = get_token()
+    project_id = client.post(
+        "/projects/", params={"token": token}, json={"label": "Big"}
+    ).json()["id"]
+    body = "x" * 100_000
+    for i in range(5):
+        resp = client.post(
+            "/documents/",
+            params={"token": token, "project_id": project_id, "label": f"doc{i}", "position": i},
+        )
+        client.put(f"/documents/{resp.json()['id']}", params={"token": token}, json={"text": body})
+
+    with track_loads() as full:
+        resp = client.get(f"/documents/project/{project_id}", params={"token": token})
+    assert resp.status_code == 200
+    assert len(resp.json()) == 5
+    # token user, ETag probe, listing
+    assert full["statements"] <= 3
+    assert full["bytes"] < 5 * len(body) + 1_000
+
+    with track_loads() as summary:
+        resp = client.get(f"/documents/project/{project_id}/summary", params={"token": token})
+    assert resp.status_code == 200
+    assert [d["label"] for d in resp.json()] == [f"doc{i}" for i in range(5)]
+    assert "text" not in resp.json()[0]
+    assert summary["statements"] <= 3
+    assert summary["bytes"] < 1_000
+
+
+def wait_for_extraction(token, doc_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/documents/{doc_id}/extraction", params={"token": token}).json()
+        if status["status"] != "pending":
+            return status["status"]
+        time.sleep(0.05)
+    raise AssertionError("extraction did not finish")
+
+
+def test_pdf_text_extracted_in_background(monkeypatch):
+    monkeypatch.setenv("PDF_EXTRACT_PAGES_PER_TASK", "2")
+    token = get_token()
+    pages = [f"page {i} of {uuid.uuid4().hex}" for i in range(5)]
+    files = {"pdf": ("paper.pdf", io.BytesIO(make_text_pdf(pages)), "application/pdf")}
+    resp = client.post("/documents/", params={"token": token}, files=files)
+    assert resp.status_code == 200
+    assert resp.json()["extraction_status"] == "pending"
+    doc_id = resp.json()["id"]
+
+    assert wait_for_extraction(token, doc_id) == "done"
+    doc = client.get(f"/documents/{doc_id}", params={"token": token}).json()
+    assert doc["text"] == "\n".join(pages)
+    assert doc["extraction_status"] == "done"
+
+
+def test_repeat_pdf_upload_served_from_text_cache(monkeypatch):
+    token = get_token()
+    pdf_bytes = make_text_pdf([f"cached {uuid.uuid4().hex}", "second page"])
+    files = {"pdf": ("paper.pdf", io.BytesIO(pdf_bytes), "application/pdf")}
+    first = client.post("/documents/", params={"token": token}, files=files).json()
+    assert wait_for_extraction(token, first["id"]) == "done"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("PyPDF2 should not run on a cache hit")
+
+    monkeypatch.setattr(pdf_text, "submit", fail)
+    files = {"pdf": ("copy.pdf", io.BytesIO(pdf_bytes), "application/pdf")}
+    second = client.post("/documents/", params={"token": token}, files=files).json()
+    assert second["extraction_status"] == "done"
+    assert second["text"] == client.get(f"/documents/{first['id']}", params={"token": token}).json()["text"]
+
+    other = client.post("/documents/", params={"token": token, "text": "my draft"}).json()
+    files = {"pdf": ("copy.pdf", io.BytesIO(pdf_bytes), "application/pdf")}
+    replaced = client.post(f"/documents/{other['id']}/pdf", params={"token": token}, files=files)
+    assert replaced.status_code == 200
+    assert replaced.json()["text"] == second["text"]
+    revs = client.get(f"/documents/{other['id']}/revisions", params={"token": token}).json()
+    assert [r["text"] for r in revs] == ["my draft"]
+
+
+def test_replacing_pdf_re_extracts_text():
+    token = get_token()
+    doc = client.post("/documents/", params={"token": token, "text": "notes"}).json()
+    marker = uuid.uuid4().hex
+    files = {"pdf": ("new.pdf", io.BytesIO(make_text_pdf([marker])), "application/pdf")}
+    resp = client.post(f"/documents/{doc['id']}/pdf", params={"token": token}, files=files)
+    assert resp.json()["extraction_status"] == "pending"
+    assert wait_for_extraction(token, doc["id"]) == "done"
+    assert client.get(f"/documents/{doc['id']}", params={"token": token}).json()["text"] == marker
+
+
+def test_edit_during_extraction_is_kept(monkeypatch):
+    queued = []
+    monkeypatch.setattr(pdf_text, "submit", lambda *args: queued.append(args))
+    token = get_token()
+    pages = [f"extracted {uuid.uuid4().hex}"]
+    files = {"pdf": ("paper.pdf", io.BytesIO(make_text_pdf(pages)), "application/pdf")}
+    doc_id = client.post("/documents/", params={"token": token}, files=files).json()["id"]
+    client.put(f"/documents/{doc_id}", params={"token": token}, json={"text": "my important edit"})
+
+    pdf_text._run(*queued[0])
+    doc = client.get(f"/documents/{doc_id}", params={"token": token}).json()
+    assert (doc["text"], doc["extraction_status"]) == ("my important edit", "done")
+    db = SessionLocal()
+    try:
+        assert pdf_text.cached_pages(db, queued[0][1]) == pages
+    finally:
+        db.close()
+
+
+def test_extraction_timeout_kills_workers(monkeypatch):
+    monkeypatch.setenv("PDF_EXTRACT_TIMEOUT", "0")
+    token = get_token()
+    files = {"pdf": ("slow.pdf", io.BytesIO(make_text_pdf([uuid.uuid4().hex])), "application/pdf")}
+    doc_id = client.post("/documents/", params={"token": token}, files=files).json()["id"]
+    assert wait_for_extraction(token, doc_id) == "failed"
+    assert multiprocessing.active_children() == []
+
+
+def test_timeout_kills_only_that_documents_tasks():
+    other = []
+    thread = threading.Thread(target=lambda: other.extend(pdf_text._run_tasks([(time.sleep, (2,))], 1, None)))
+    thread.start()
+    with pytest.raises(TimeoutError):
+        pdf_text._run_tasks([(time.sleep, (60,)), (time.sleep, (60,))], 2, time.monotonic() + 0.5)
+    thread.join()
+    assert other == [None]
+    assert multiprocessing.active_children() == []
+
+
+def test_extraction_deadline_starts_when_a_worker_is_free(monkeypatch, tmp_path):
+    monkeypatch.setenv("PDF_EXTRACT_WORKERS", "1")
+    path = tmp_path / "queued.pdf"
+    path.write_bytes(make_text_pdf(["first", "second"]))
+    # Another document holds the only worker for longer than the timeout.
+    pdf_text._slots.acquire()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pdf_text.extract_pages(str(path), timeout=3)))
+    thread.start()
+    time.sleep(3.5)
+    pdf_text._slots.release()
+    thread.join()
+    assert result == [["first", "second"]]
+
+
+def make_patch(old, new):
+    dmp = diff_match_patch()
+    return dmp.patch_toText(dmp.patch_make(old, new))
+
+
+def test_versioned_patch_protocol():
+    token = get_token()
+    doc = client.post("/documents/", params={"token": token, "text": "Hello world"}).json()
+    assert doc["version"] == 1
+
+    resp = client.patch(
+        f"/documents/{doc['id']}",
+        params={"token": token},
+        json={"base_version": 1, "patch": make_patch("Hello world", "Hello brave world")},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "id": doc["id"],
+        "version": 2,
+        "checksum": hashlib.sha256(b"Hello brave world").hexdigest(),
+    }
+
+    stale = client.patch(
+        f"/documents/{doc['id']}",
+        params={"token": token},
+        json={"base_version": 1, "patch": make_patch("Hello world", "Hello there world")},
+    )
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["version"] == 2
+
+    broken = client.patch(
+        f"/documents/{doc['id']}",
+        params={"token": token},
+        json={"base_version": 2, "patch": make_patch("Something entirely different", "Other")},
+    )
+    assert broken.status_code == 409
+
+    current = client.get(f"/documents/{doc['id']}", params={"token": token}).json()
+    assert current["text"] == "Hello brave world"
+    assert current["version"] == 2
+
+    put = client.put(f"/documents/{doc['id']}", params={"token": token}, json={"text": "Reset"})
+    assert put.json()["version"] == 3
@@ -0,0 +1,118 @@
+import sys, os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.services import identity
+
+client = TestClient(app)
+
+
+def article(pmid, title, doi):
+    return (
+        f"<PubmedArticle><MedlineCitation><PMID Version='1'>{pmid}</PMID><Article>"
+        "<Journal><JournalIssue><PubDate><Year>2021</Year></PubDate></JournalIssue>"
+        "<ISOAbbreviation>BMJ</ISOAbbreviation></Journal>"
+        f"<ArticleTitle>{title}</ArticleTitle></Article></MedlineCitation>"
+        f"<PubmedData><ArticleIdList><ArticleId IdType='doi'>{doi}</ArticleId></ArticleIdList>"
+        "</PubmedData></PubmedArticle>"
+    )
+
+
+def get_token():
+    username = f"dup_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def new_project(token, label="Dups"):
+    return client.post("/projects/", params={"token": token}, json={"label": label}).json()["id"]
+
+
+def add(token, project_id, query):
+    return client.post("/references/", params={"token": token}, data={"project_id": project_id, "query": query})
+
+
+def test_keys_are_normalized():
+    assert identity.normalize_doi("https://doi.org/10.1000/ABC") == "10.1000/abc"
+    assert identity.normalize_doi("doi: 10.1000/abc") == "10.1000/abc"
+    assert identity.normalize_doi("not a doi") is None
+    assert identity.normalize_pmid(" 00123 ") == "123"
+    assert identity.normalize_pmid("abc") is None
+    assert identity.fingerprint("Café  culture: a Review.", "2020") == identity.fingerprint("cafe culture a review", "2020-01")
+    assert identity.fingerprint("Cafe culture", "2020") != identity.fingerprint("Cafe culture", "2021")
+    assert identity.fingerprint(" ... ", "2020") is None
+
+
+def test_add_reference_rejects_duplicates(pubmed):
+    token = get_token()
+    proj = new_project(token)
+    pubmed.articles["501"] = article("501", "Salt and blood pressure.", "10.1136/bmj.501")
+    first = add(token, proj, "501")
+    assert first.status_code == 200
+    assert first.json()["doi"] == "10.1136/bmj.501"
+
+    resp = add(token, proj, "501")
+    assert resp.status_code == 409
+    assert resp.json()["detail"] == f"Same pmid as reference {first.json()['id']}"
+
+    assert add(token, proj, "A free-text note").status_code == 200
+    assert add(token, proj, "a free text NOTE").status_code == 409
+    assert add(token, new_project(token), "501").status_code == 200
+
+
+def test_batch_import_skips_existing_and_repeated_papers(pubmed):
+    token = get_token()
+    proj = new_project(token)
+    pubmed.articles["601"] = article("601", "Original", "10.1/one")
+    pubmed.articles["602"] = article("602", "Erratum", "10.1/ONE")
+    pubmed.articles["603"] = article("603", "Other", "10.1/three")
+    existing = add(token, proj, "603").json()["id"]
+
+    resp = client.post(
+        "/references/batch", params={"token": token}, json={"project_id": proj, "pmids": ["601", "602", "603"]}
+    )
+    assert [r["pmid"] for r in resp.json()["created"]] == ["601"]
+    assert resp.json()["failed"] == [
+        {"pmid": "602", "error": "Same doi as PMID 601 in this batch"},
+        {"pmid": "603", "error": f"Same pmid as reference {existing}"},
+    ]
+
+
+def test_duplicates_are_grouped_across_projects(pubmed):
+    token = get_token()
+    p1, p2, p3 = (new_project(token, label) for label in ("P1", "P2", "P3"))
+    pubmed.articles["701"] = article("701", "Shared paper", "10.1/shared")
+    pubmed.articles["702"] = article("702", "Shared  paper!", "10.1/reprint")
+    pubmed.articles["703"] = article("703", "Unique paper", "10.1/unique")
+    a = add(token, p1, "701").json()["id"]
+    b = add(token, p2, "701").json()["id"]
+    c = add(token, p3, "702").json()["id"]
+    add(token, p1, "703")
+    stranger = get_token()
+    add(stranger, new_project(stranger), "701")
+
+    groups = client.get("/references/duplicates", params={"token": token}).json()
+    summary = {(g["kind"], tuple((r["id"], r["project_id"]) for r in g["references"])) for g in groups}
+    assert summary == {
+        ("doi", ((a, p1), (b, p2))),
+        ("fingerprint", ((a, p1), (b, p2), (c, p3))),
+        ("pmid", ((a, p1), (b, p2))),
+    }
+    assert client.get("/references/duplicates", params={"token": get_token()}).json() == []
+
+
+def test_edits_may_not_create_duplicates():
+    token = get_token()
+    proj = new_project(token)
+    first = add(token, proj, "Cohort study of sleep").json()["id"]
+    second = add(token, proj, "Trial of exercise").json()["id"]
+
+    resp = client.put(f"/references/{second}", params={"token": token}, json={"title": "Cohort Study of Sleep."})
+    assert resp.status_code == 409
+    assert resp.json()["detail"] == f"Same fingerprint as reference {first}"
+    resp = client.put(f"/references/{first}", params={"token": token}, json={"title": "Cohort study of sleep!"})
+    assert resp.status_code == 200
@@ -0,0 +1,66 @@
+import sys, os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def get_token():
+    username = f"etag_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def revalidate(url, token, tag):
+    return client.get(url, params={"token": token}, headers={"If-None-Match": tag})
+
+
+def test_document_etag_changes_with_content():
+    token = get_token()
+    doc_id = client.post("/documents/", params={"token": token, "text": "v1"}).json()["id"]
+    url = f"/documents/{doc_id}"
+
+    first = client.get(url, params={"token": token})
+    tag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = revalidate(url, token, tag)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == tag
+
+    client.put(url, params={"token": token}, json={"label": "renamed"})
+    fresh = revalidate(url, token, tag)
+    assert fresh.status_code == 200
+    assert fresh.json()["label"] == "renamed"
+    assert fresh.headers["etag"] != tag
+
+
+def test_listing_etags_track_membership():
+    token = get_token()
+    project_id = client.post("/projects/", params={"token": token}, json={"label": "E"}).json()["id"]
+    client.post("/documents/", params={"token": token, "project_id": project_id, "text": "a"})
+
+    for url in (
+        f"/documents/project/{project_id}",
+        f"/documents/project/{project_id}/summary",
+        f"/references/project/{project_id}",
+        f"/projects/{project_id}",
+    ):
+        tag = client.get(url, params={"token": token}).headers["etag"]
+        assert revalidate(url, token, tag).status_code == 304
+
+    docs_url = f"/documents/project/{project_id}"
+    docs_tag = client.get(docs_url, params={"token": token}).headers["etag"]
+    refs_url = f"/references/project/{project_id}"
+    refs_tag = client.get(refs_url, params={"token": token}).headers["etag"]
+
+    client.post("/documents/", params={"token": token, "project_id": project_id, "text": "b"})
+    client.post("/references/", params={"token": token}, data={"project_id": project_id, "query": "x"})
+
+    assert revalidate(docs_url, token, docs_tag).status_code == 200
+    assert revalidate(refs_url, token, refs_tag).status_code == 200
@@ -0,0 +1,122 @@
+import sys, os
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from backend import migrations, models
+from backend.api.documents import _project_documents
+from backend.db import Base
+from backend.services import identity
+
+NEW_INDEXES = {
+    "documents": "ix_documents_creator_project_position",
+    "projects": "ix_projects_author_id",
+    "references": "ix_references_project_id",
+    "document_revisions": "ix_document_revisions_document_seq",
+    "settings": "ux_settings_key_global",
+}
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    migrations.upgrade(engine)
+    return engine
+
+
+def plan(engine, stmt) -> str:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return " | ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+
+
+def test_project_documents_listing_uses_index_for_filter_and_order(engine):
+    detail = plan(engine, _project_documents(1, SimpleNamespace(id=1)))
+    assert "ix_documents_creator_project_position" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_reference_listing_uses_project_index(engine):
+    stmt = (
+        select(models.Reference)
+        .join(models.Project)
+        .where(models.Project.id == 1, models.Project.author_id == 1)
+        .order_by(models.Reference.id)
+    )
+    assert "ix_references_project_id" in plan(engine, stmt)
+
+
+def test_projects_by_author_use_index(engine):
+    stmt = select(models.Project).where(models.Project.author_id == 1)
+    assert "ix_projects_author_id" in plan(engine, stmt)
+
+
+def test_setting_lookups_use_unique_indexes(engine):
+    user = select(models.Setting).where(models.Setting.key == "theme", models.Setting.user_id == 1)
+    assert "ux_settings_key_user" in plan(engine, user)
+    global_ = select(models.Setting).where(
+        models.Setting.key == "theme", models.Setting.user_id.is_(None)
+    )
+    # Either unique index answers ``user_id IS NULL``; what matters is no scan.
+    assert "SEARCH settings USING INDEX ux_settings_key" in plan(engine, global_)
+
+
+def test_revision_history_uses_index_for_filter_and_order(engine):
+    stmt = (
+        select(models.DocumentRevision)
+        .where(models.DocumentRevision.document_id == 1)
+        .order_by(models.DocumentRevision.seq.desc())
+    )
+    detail = plan(engine, stmt)
+    assert "ix_document_revisions_document_seq" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_identity_lookup_probes_key_indexes(engine):
+    stmt = identity.lookup_query(1, {"pmid": ["1"], "doi": ["10.1/x"], "fingerprint": ["f"]})
+    detail = plan(engine, stmt)
+    for name in ("ix_references_pmid_project", "ix_references_doi_project", "ix_references_fingerprint_project"):
+        assert name in detail
+    assert "SCAN" not in detail.replace("SCAN CONSTANT", "")
+
+
+def test_duplicates_query_reads_only_the_users_references(engine):
+    detail = plan(engine, identity.duplicates_query(1))
+    assert "ix_projects_author_id" in detail
+    assert 'SCAN "references"' not in detail and "SCAN references" not in detail
+
+
+def test_migration_adds_indexes_and_dedupes_settings(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in list(NEW_INDEXES.values()) + ["ux_settings_key_user"]:
+            conn.execute(text(f"DROP INDEX {name}"))
+        conn.execute(text(
+            "INSERT INTO settings (key, value, user_id) VALUES "
+            "('theme', 'light', NULL), ('theme', 'dark', NULL), ('theme', 'blue', 1)"
+        ))
+
+    migrations.upgrade(engine)
+
+    insp = inspect(engine)
+    for table, name in NEW_INDEXES.items():
+        assert name in {ix["name"] for ix in insp.get_indexes(table)}
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT value, user_id FROM settings ORDER BY id")).all()
+    assert [tuple(r) for r in rows] == [("dark", None), ("blue", 1)]
+
+
+def test_migration_backfills_reference_fingerprints(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('INSERT INTO "references" (title, year) VALUES (\'A Title.\', \'2020\')'))
+
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        stored = conn.execute(text('SELECT fingerprint FROM "references"')).scalar()
+    assert stored == identity.fingerprint("a title", "2020")
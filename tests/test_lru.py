@@ -0,0 +1,36 @@
+import sys, os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from backend.services.lru import LRUCache
+
+
+def test_least_recently_used_unpinned_entry_is_evicted():
+    cache = LRUCache(max_size=2, ttl=60, pinned=["global"])
+    cache.put("global", 0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert [cache.get(k) for k in ("global", "a", "b", "c")] == [0, 1, None, 3]
+
+
+def test_fill_is_dropped_after_a_write_and_keeps_expiry():
+    cache = LRUCache(max_size=2, ttl=60)
+    generation = cache.generation()
+    cache.update("a", lambda value: value + 1)
+    cache.fill("a", 1, generation)
+    assert cache.get("a") is None
+
+    cache.put("a", 1, ttl=0.05)
+    cache.fill("a", 2, cache.generation())
+    assert cache.get("a") == 2
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = LRUCache(max_size=0, ttl=60)
+    cache.put("a", 1)
+    cache.fill("b", 2, cache.generation())
+    assert len(cache) == 0
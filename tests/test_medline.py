@@ -0,0 +1,114 @@
+import sys, os
+import gzip
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from backend import models
+from backend.db import SessionLocal, engine
+from backend.main import app
+from backend.services import medline
+
+client = TestClient(app)
+
+
+def article(pmid, title, year="2020"):
+    return f"""<PubmedArticle><MedlineCitation><PMID Version="1">{pmid}</PMID><Article>
+      <Journal><JournalIssue><PubDate><Year>{year}</Year></PubDate></JournalIssue>
+      <ISOAbbreviation>J Test</ISOAbbreviation></Journal>
+      <ArticleTitle>{title}</ArticleTitle>
+      <AuthorList><Author><LastName>Doe</LastName><Initials>J</Initials></Author></AuthorList>
+    </Article></MedlineCitation></PubmedArticle>"""
+
+
+def write_baseline(path, articles, deleted=()):
+    body = "".join(article(pmid, title) for pmid, title in articles)
+    if deleted:
+        body += "<DeleteCitation>" + "".join(f"<PMID>{p}</PMID>" for p in deleted) + "</DeleteCitation>"
+    with gzip.open(path, "wt") as f:
+        f.write(f'<?xml version="1.0"?><PubmedArticleSet>{body}</PubmedArticleSet>')
+    return path
+
+
+def base_pmid():
+    return 900000000 + uuid.uuid4().int % 90000000
+
+
+def catalogue(pmids):
+    with SessionLocal() as db:
+        rows = db.scalars(select(models.CatalogEntry).where(models.CatalogEntry.pmid.in_(pmids)))
+        return {row.pmid: row.title for row in rows}
+
+
+def get_token(username=None):
+    username = username or f"medline_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def test_import_streams_in_batches_and_upserts(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEDLINE_BATCH_SIZE", "3")
+    first = base_pmid()
+    pmids = [str(first + i) for i in range(10)]
+    stats = medline.import_file(write_baseline(tmp_path / "base.xml.gz", [(p, f"Title {p}") for p in pmids]), engine)
+    assert (stats.articles, stats.deleted) == (10, 0)
+    assert stats.rate > 0
+    assert catalogue(pmids) == {p: f"Title {p}" for p in pmids}
+
+    update = write_baseline(tmp_path / "update.xml.gz", [(pmids[0], "Revised")], deleted=pmids[1:3])
+    stats = medline.import_file(update, engine)
+    assert (stats.articles, stats.deleted) == (1, 2)
+    entries = catalogue(pmids)
+    assert entries[pmids[0]] == "Revised"
+    assert pmids[1] not in entries and pmids[2] not in entries and len(entries) == 8
+
+
+def test_iter_records_clears_parsed_articles(tmp_path):
+    path = write_baseline(tmp_path / "base.xml.gz", [(str(i), f"T{i}") for i in range(1, 2001)])
+    sizes = []
+    with gzip.open(path) as source:
+        records = medline.iter_records(source)
+        for kind, record in records:
+            assert kind == medline.ARTICLE
+            root = records.gi_frame.f_locals["root"]
+            sizes.append(len(root))
+    # The parser reads ahead one buffer, but nothing already yielded is kept.
+    assert len(sizes) == 2000 and max(sizes) < 200
+
+
+def test_catalogued_pmids_need_no_pubmed_request(tmp_path, pubmed):
+    pmid = str(base_pmid())
+    medline.import_file(write_baseline(tmp_path / "base.xml.gz", [(pmid, "From the catalogue")]), engine)
+    token = get_token()
+    proj_id = client.post("/projects/", params={"token": token}, json={"label": "M", "description": ""}).json()["id"]
+
+    resp = client.post("/references/", params={"token": token}, data={"project_id": proj_id, "query": pmid})
+    assert resp.status_code == 200
+    assert (resp.json()["title"], resp.json()["authors"], resp.json()["year"]) == ("From the catalogue", "Doe J", "2020")
+
+    other = client.post("/projects/", params={"token": token}, json={"label": "N", "description": ""}).json()["id"]
+    resp = client.post("/references/batch", params={"token": token}, json={"project_id": other, "pmids": [pmid]})
+    assert [r["title"] for r in resp.json()["created"]] == ["From the catalogue"]
+    assert pubmed.requests == []
+
+
+def test_catalog_import_endpoint_is_admin_only(tmp_path, monkeypatch):
+    admin = f"admin_{uuid.uuid4().hex[:6]}"
+    monkeypatch.setenv("ADMIN_USERNAME", admin)
+    monkeypatch.setenv("MEDLINE_DIR", str(tmp_path))
+    pmid = str(base_pmid())
+    write_baseline(tmp_path / "base.xml.gz", [(pmid, "Imported by admin")])
+
+    resp = client.post("/references/catalog/import", params={"token": get_token()}, json={"path": "base.xml.gz"})
+    assert resp.status_code == 403
+
+    token = get_token(admin)
+    resp = client.post("/references/catalog/import", params={"token": token}, json={"path": "../etc/passwd"})
+    assert resp.status_code == 404
+    resp = client.post("/references/catalog/import", params={"token": token}, json={"path": "base.xml.gz"})
+    assert resp.status_code == 200
+    assert resp.json()["articles"] == 1 and resp.json()["articles_per_second"] > 0
+    assert catalogue([pmid]) == {pmid: "Imported by admin"}
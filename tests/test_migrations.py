@@ -0,0 +1,217 @@
+import sys, os
+import subprocess
+import threading
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import create_engine, inspect, text
+
+from sqlalchemy.orm import Session
+
+from backend import main, migrations
+from backend.migrations import m0001_baseline
+from backend.services import blobs, revisions, search
+from backend.db import Base, SessionLocal
+from backend.models import User
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+
+# The schema ``create_all`` produced before any of the changes that
+# migrations now carry (SQLite DDL of the original models).
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR NOT NULL, password_hash VARCHAR NOT NULL,
+        first_name VARCHAR, last_name VARCHAR, age INTEGER, email VARCHAR, PRIMARY KEY (id))""",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    """CREATE TABLE projects (id INTEGER NOT NULL, label VARCHAR NOT NULL, description VARCHAR,
+        author_id INTEGER, coauthors VARCHAR, PRIMARY KEY (id), FOREIGN KEY(author_id) REFERENCES users (id))""",
+    "CREATE INDEX ix_projects_id ON projects (id)",
+    """CREATE TABLE settings (id INTEGER NOT NULL, "key" VARCHAR NOT NULL, value VARCHAR NOT NULL,
+        user_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id))""",
+    "CREATE INDEX ix_settings_id ON settings (id)",
+    """CREATE TABLE documents (id INTEGER NOT NULL, text TEXT, pdf BLOB, image BLOB, label VARCHAR,
+        description VARCHAR, creator_id INTEGER, project_id INTEGER, notes VARCHAR, position INTEGER,
+        PRIMARY KEY (id), FOREIGN KEY(creator_id) REFERENCES users (id),
+        FOREIGN KEY(project_id) REFERENCES projects (id))""",
+    "CREATE INDEX ix_documents_id ON documents (id)",
+    """CREATE TABLE "references" (id INTEGER NOT NULL, title VARCHAR, authors VARCHAR, journal VARCHAR,
+        year VARCHAR, pdf BLOB, project_id INTEGER, PRIMARY KEY (id),
+        FOREIGN KEY(project_id) REFERENCES projects (id))""",
+    'CREATE INDEX ix_references_id ON "references" (id)',
+    """CREATE TABLE document_revisions (id INTEGER NOT NULL, document_id INTEGER, text TEXT,
+        created_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(document_id) REFERENCES documents (id))""",
+    "CREATE INDEX ix_document_revisions_id ON document_revisions (id)",
+]
+
+
+def legacy_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    return engine
+
+
+def test_fresh_database_is_created_at_head(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    head = migrations.discover()[-1].version
+
+    assert migrations.upgrade(engine) == head
+    assert migrations.upgrade(engine) == head
+    with engine.connect() as conn:
+        assert inspect(conn).has_table("documents")
+        assert migrations.current_version(conn) == head
+        versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+    assert sorted(versions) == [m.version for m in migrations.discover()]
+
+
+def test_unversioned_database_is_upgraded_from_baseline(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+    assert versions[0] == migrations.BASELINE
+
+
+def test_concurrent_upgrades_apply_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    errors = []
+
+    def run():
+        try:
+            migrations.upgrade(engine)
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+    assert len(versions) == len(set(versions)) == len(migrations.discover())
+
+
+def test_admin_seeding_is_idempotent_under_concurrency(monkeypatch):
+    username = f"admin_{uuid.uuid4().hex[:6]}"
+    monkeypatch.setenv("ADMIN_USERNAME", username)
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    threads = [threading.Thread(target=main.ensure_admin_user) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db = SessionLocal()
+    try:
+        assert db.query(User).filter(User.username == username).count() == 1
+    finally:
+        db.close()
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    code = (
+        "import sys, backend.main; "
+        "print(','.join(m for m in ('PyPDF2', 'diff_match_patch', 'httpx', 'jose') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_baseline_adds_columns_and_numbers_legacy_revisions(tmp_path):
+    engine = legacy_engine(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO documents (id, text) VALUES (1, 'c'), (2, 'x')"))
+        conn.execute(text(
+            "INSERT INTO document_revisions (id, document_id, text, created_at) VALUES "
+            "(1, 1, 'a', '2024-01-01 10:00:00'), (2, 2, 'x', '2024-01-01 10:00:00'), (3, 1, 'b', '2024-01-02 10:00:00')"
+        ))
+        m0001_baseline.upgrade(conn)
+        m0001_baseline.upgrade(conn)
+
+    insp = inspect(engine)
+    assert {"seq", "delta", "author_id"} <= {c["name"] for c in insp.get_columns("document_revisions")}
+    assert {"version", "extraction_status", "updated_at"} <= {c["name"] for c in insp.get_columns("documents")}
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, seq FROM document_revisions ORDER BY id")).all()
+        assert conn.execute(text("SELECT min(version) FROM documents")).scalar() == 1
+    assert [tuple(r) for r in rows] == [(1, 1), (2, 1), (3, 2)]
+    with Session(engine) as db:
+        assert [r.text for r in revisions.list_revisions(db, 1)] == ["a", "b"]
+
+
+def test_baseline_moves_stored_files_into_the_blob_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "store", blobs.BlobStore(tmp_path / "blobs"))
+    engine = legacy_engine(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO documents (id, pdf, image) VALUES (1, :pdf, :image), (2, NULL, NULL)"),
+            {"pdf": b"%PDF-1.4 legacy", "image": b"\x89PNG legacy"},
+        )
+        conn.execute(text('INSERT INTO "references" (id, pdf) VALUES (1, :pdf)'), {"pdf": b"%PDF-1.4 legacy"})
+        m0001_baseline.upgrade(conn)
+
+    with engine.connect() as conn:
+        docs = conn.execute(text("SELECT pdf_hash, pdf_size, image_hash FROM documents ORDER BY id")).all()
+        ref = conn.execute(text('SELECT pdf_hash, pdf_size FROM "references"')).one()
+    assert docs[1] == (None, None, None)
+    assert tuple(ref) == tuple(docs[0])[:2] and ref.pdf_size == len(b"%PDF-1.4 legacy")
+    with blobs.store.open(docs[0].pdf_hash) as f:
+        assert f.read() == b"%PDF-1.4 legacy"
+    with blobs.store.open(docs[0].image_hash) as f:
+        assert f.read() == b"\x89PNG legacy"
+    assert "pdf" not in {c["name"] for c in inspect(engine).get_columns("documents")}
+
+
+def test_baseline_installs_and_backfills_the_search_index(tmp_path):
+    engine = legacy_engine(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, password_hash) VALUES (1, 'u', 'x')"))
+        conn.execute(text("INSERT INTO projects (id, label, author_id) VALUES (1, 'p', 1)"))
+        conn.execute(text("INSERT INTO documents (id, label, text, creator_id, project_id) VALUES (1, 'd', 'legacy zebra', 1, 1)"))
+        conn.execute(text('INSERT INTO "references" (id, title, project_id) VALUES (1, \'Zebra stripes\', 1)'))
+        m0001_baseline.upgrade(conn)
+        conn.execute(text("UPDATE documents SET text = 'edited okapi' WHERE id = 1"))
+
+    with Session(engine) as db:
+        assert {(h.kind, h.id) for h in search.search(db, 1, "zebra")} == {("reference", 1)}
+        assert [(h.kind, h.id) for h in search.search(db, 1, "okapi")] == [("document", 1)]
+
+
+def schema(engine):
+    insp = inspect(engine)
+    return {
+        table: (
+            {c["name"] for c in insp.get_columns(table)},
+            {ix["name"] for ix in insp.get_indexes(table)},
+        )
+        for table in insp.get_table_names()
+    }
+
+
+def test_legacy_database_is_upgraded_to_head(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "store", blobs.BlobStore(tmp_path / "blobs"))
+    engine = legacy_engine(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, password_hash) VALUES (1, 'u', 'x')"))
+        conn.execute(text("INSERT INTO documents (id, text, pdf, creator_id) VALUES (1, 'zebra', :pdf, 1)"), {"pdf": b"%PDF"})
+        conn.execute(text(
+            "INSERT INTO document_revisions (document_id, text, created_at) VALUES (1, 'a', '2024-01-01 10:00:00')"
+        ))
+
+    head = migrations.discover()[-1].version
+    assert migrations.upgrade(engine) == head
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.upgrade(fresh)
+    assert schema(engine) == schema(fresh)
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+        assert conn.execute(text("SELECT pdf_size, version FROM documents")).one() == (4, 1)
+    assert versions == [m.version for m in migrations.discover()]
+    with Session(engine) as db:
+        assert [h.id for h in search.search(db, 1, "zebra")] == [1]
+
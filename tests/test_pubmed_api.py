@@ -1,18 +1,20 @@
 import sys, os
 import uuid
-from unittest.mock import patch
-import httpx
+import asyncio
+import threading
+import time
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
+from backend.services import pubmed_cache, references as ref_service
 
 client = TestClient(app)
 
-SAMPLE_XML = """<?xml version='1.0' encoding='UTF-8'?>
-<PubmedArticleSet>
-  <PubmedArticle>
+SAMPLE_ARTICLE = """  <PubmedArticle>
     <MedlineCitation>
+      <PMID Version="1">37936010</PMID>
       <Article>
         <Journal>
           <JournalIssue>
@@ -41,20 +43,7 @@ SAMPLE_XML = """<?xml version='1.0' encoding='UTF-8'?>
         </AuthorList>
       </Article>
     </MedlineCitation>
-  </PubmedArticle>
-</PubmedArticleSet>"""
-
-class FakeResponse:
-    def __init__(self, text, status_code=200):
-        self.text = text
-        self.status_code = status_code
-    def raise_for_status(self):
-        if self.status_code >= 400:
-            raise Exception("HTTP error")
-
-
-def mock_get(url, timeout=10):
-    return FakeResponse(SAMPLE_XML)
+  </PubmedArticle>"""
 
 
 def get_token():
@@ -64,7 +53,7 @@ def get_token():
     return resp.json()["access_token"]
 
 
-def test_fetch_pubmed_reference_and_store():
+def test_fetch_pubmed_reference_and_store(pubmed):
     token = get_token()
     proj_resp = client.post(
         "/projects/",
@@ -74,12 +63,12 @@ def test_fetch_pubmed_reference_and_store():
     assert proj_resp.status_code == 200
     proj_id = proj_resp.json()["id"]
 
-    with patch("backend.services.references.httpx.get", side_effect=mock_get):
-        resp = client.post(
-            "/references/",
-            params={"token": token},
-            data={"project_id": proj_id, "query": "37936010"},
-        )
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    resp = client.post(
+        "/references/",
+        params={"token": token},
+        data={"project_id": proj_id, "query": "37936010"},
+    )
 
     assert resp.status_code == 200
     ref = resp.json()
@@ -94,7 +83,7 @@ def test_fetch_pubmed_reference_and_store():
     assert get_resp.json() == ref
 
 
-def test_fetch_pubmed_reference_network_error():
+def test_fetch_pubmed_reference_network_error(pubmed):
     token = get_token()
     proj_resp = client.post(
         "/projects/",
@@ -104,22 +93,182 @@ def test_fetch_pubmed_reference_network_error():
     assert proj_resp.status_code == 200
     proj_id = proj_resp.json()["id"]
 
-    def raise_error(url, timeout=10):
-        raise httpx.HTTPError("boom")
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    pubmed.failures = [503] * (ref_service.client.retries + 1)
+    resp = client.post(
+        "/references/",
+        params={"token": token},
+        data={"project_id": proj_id, "query": "37936010"},
+    )
+
+    assert resp.status_code == 502
+    assert resp.json()["detail"].startswith("PubMed request failed")
+    refs = client.get(f"/references/project/{proj_id}", params={"token": token}).json()
+    assert refs == []
+
+
+def test_unknown_pmid_is_not_stored(pubmed):
+    token = get_token()
+    proj_id = client.post("/projects/", params={"token": token}, json={"label": "Missing"}).json()["id"]
+    resp = client.post("/references/", params={"token": token}, data={"project_id": proj_id, "query": "999"})
+    assert (resp.status_code, resp.json()["detail"]) == (502, "Not found in PubMed")
+
+
+def test_transient_errors_are_retried(pubmed):
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    pubmed.failures = [503, 429]
+    data = asyncio.run(ref_service.fetch_reference("37936010"))
+    assert data["journal"] == "J Neurol"
+    assert len(pubmed.requests) == 3
+
+
+def test_long_retry_after_fails_instead_of_waiting(pubmed):
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    pubmed.failures = [429]
+    pubmed.retry_after = "3600"
+    start = time.monotonic()
+    with pytest.raises(ref_service.PubMedLookupError, match="429"):
+        asyncio.run(ref_service.fetch_reference("37936010"))
+    assert time.monotonic() - start < 5
+    assert len(pubmed.requests) == 1
+
+    pubmed.failures = [429]
+    pubmed.retry_after = "0"
+    assert asyncio.run(ref_service.fetch_reference("37936010"))["journal"] == "J Neurol"
+
+
+def test_metadata_cache_is_used_off_the_event_loop(pubmed, monkeypatch):
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    cache = pubmed_cache.cache
+    threads = []
+
+    def record(method):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return wrapper
+
+    monkeypatch.setattr(cache, "get_many", record(cache.get_many))
+    monkeypatch.setattr(cache, "put_many", record(cache.put_many))
+    asyncio.run(ref_service.fetch_reference("37936010"))
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+def test_client_reuses_connections(pubmed):
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+
+    async def lookups():
+        for _ in range(3):
+            await ref_service.client.efetch(["37936010"])
+
+    asyncio.run(lookups())
+    assert len({client_address for _, client_address, _, _ in pubmed.requests}) == 1
+
+
+def test_token_bucket_spaces_requests():
+    bucket = ref_service.TokenBucket(rate=20)
 
-    with patch("backend.services.references.httpx.get", side_effect=raise_error):
-        resp = client.post(
-            "/references/",
-            params={"token": token},
-            data={"project_id": proj_id, "query": "37936010"},
-        )
+    async def acquire(n):
+        for _ in range(n):
+            await bucket.acquire()
 
+    start = time.monotonic()
+    asyncio.run(acquire(5))
+    # The first token is available at once, the other four 50 ms apart.
+    assert time.monotonic() - start >= 0.19
+
+
+def test_api_key_raises_default_rate(monkeypatch):
+    monkeypatch.delenv("PUBMED_RATE_LIMIT", raising=False)
+    assert ref_service.PubMedClient(api_key="").limiter.rate == 3
+    assert ref_service.PubMedClient(api_key="secret").limiter.rate == 10
+
+
+def make_article(pmid, title):
+    return (
+        f"<PubmedArticle><MedlineCitation><PMID Version='1'>{pmid}</PMID><Article>"
+        "<Journal><JournalIssue><PubDate><Year>2020</Year></PubDate></JournalIssue>"
+        "<ISOAbbreviation>Lancet</ISOAbbreviation></Journal>"
+        f"<ArticleTitle>{title}</ArticleTitle></Article></MedlineCitation></PubmedArticle>"
+    )
+
+
+def test_batch_import_uses_chunked_efetch(pubmed, monkeypatch):
+    monkeypatch.setenv("PUBMED_EFETCH_BATCH", "2")
+    token = get_token()
+    proj_id = client.post("/projects/", params={"token": token}, json={"label": "Batch"}).json()["id"]
+    for pmid in ("101", "102", "103", "104", "105"):
+        pubmed.articles[pmid] = make_article(pmid, f"Paper {pmid}")
+
+    pmids = ["101", "102", "103", "999", "104", "105", "102", "abc"]
+    resp = client.post(
+        "/references/batch", params={"token": token}, json={"project_id": proj_id, "pmids": pmids}
+    )
     assert resp.status_code == 200
-    ref = resp.json()
-    assert ref == {
-        "id": ref["id"],
-        "title": "37936010",
-        "authors": "",
-        "journal": "",
-        "year": "",
-    }
+    result = resp.json()
+    assert [r["title"] for r in result["created"]] == [f"Paper {p}" for p in ("101", "102", "103", "104", "105")]
+    assert result["failed"] == [
+        {"pmid": "999", "error": "Not found in PubMed"},
+        {"pmid": "abc", "error": "Not a PMID"},
+    ]
+    # 6 distinct numeric IDs in chunks of 2.
+    assert sorted(params["id"][0] for _, _, _, params in pubmed.requests) == ["101,102", "103,999", "104,105"]
+
+    listed = client.get(f"/references/project/{proj_id}", params={"token": token}).json()
+    assert len(listed) == 5
+
+
+def test_batch_import_reports_failed_chunks(pubmed):
+    token = get_token()
+    proj_id = client.post("/projects/", params={"token": token}, json={"label": "Batch"}).json()["id"]
+    pubmed.failures = [500] * (ref_service.client.retries + 1)
+    resp = client.post(
+        "/references/batch", params={"token": token}, json={"project_id": proj_id, "pmids": ["1", "2"]}
+    )
+    result = resp.json()
+    assert result["created"] == []
+    assert [f["pmid"] for f in result["failed"]] == ["1", "2"]
+    assert all(f["error"].startswith("PubMed request failed") for f in result["failed"])
+
+
+def test_metadata_cache_serves_repeat_lookups_offline(pubmed):
+    token = get_token()
+    proj_id = client.post("/projects/", params={"token": token}, json={"label": "Cache"}).json()["id"]
+    pubmed.articles["37936010"] = SAMPLE_ARTICLE
+    form = {"project_id": proj_id, "query": "37936010"}
+    first = client.post("/references/", params={"token": token}, data=form).json()
+    assert first["pmid"] == "37936010"
+
+    pubmed.articles.clear()
+    pubmed.failures = [503] * 10
+    other = client.post("/projects/", params={"token": token}, json={"label": "Other"}).json()["id"]
+    second = client.post("/references/", params={"token": token}, data=dict(form, project_id=other)).json()
+    assert second["title"] == first["title"]
+    assert len(pubmed.requests) == 1
+
+
+def test_stale_metadata_is_revalidated_and_served_on_failure(pubmed):
+    pubmed.articles["201"] = make_article("201", "Original")
+    asyncio.run(ref_service.fetch_reference("201"))
+    cache = pubmed_cache.cache
+    cache.ttl = 0
+
+    pubmed.articles["201"] = make_article("201", "Corrected")
+    assert asyncio.run(ref_service.fetch_reference("201"))["title"] == "Corrected"
+
+    pubmed.failures = [503] * (ref_service.client.retries + 1)
+    assert asyncio.run(ref_service.fetch_reference("201"))["title"] == "Corrected"
+    assert len(pubmed.requests) == 2 + ref_service.client.retries + 1
+
+
+def test_metadata_cache_evicts_least_recently_used(tmp_path):
+    cache = pubmed_cache.MetadataCache(tmp_path / "lru.db", ttl=3600, max_entries=2)
+    cache.put_many({"1": {"title": "a"}})
+    cache.put_many({"2": {"title": "b"}})
+    time.sleep(0.01)
+    cache.get("1")
+    cache.put_many({"3": {"title": "c"}})
+    assert set(cache.get_many(["1", "2", "3"])) == {"1", "3"}
+    assert len(cache) == 2
+    cache.close()
@@ -0,0 +1,101 @@
+import sys, os
+import asyncio
+import sqlite3
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend import db
+from backend.api import users
+from backend.main import app
+from backend.services import replica, settings as settings_service
+
+client = TestClient(app)
+
+
+def get_token():
+    username = f"replica_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+@pytest.fixture
+def replica_db(tmp_path, monkeypatch):
+    """Route reads to a snapshot of the primary, i.e. a replica that stopped replicating."""
+
+    def snapshot():
+        path = tmp_path / "replica.db"
+        src, dst = sqlite3.connect(db.DB_PATH), sqlite3.connect(path)
+        src.backup(dst)
+        src.close()
+        dst.close()
+        _, async_replica = db.make_engines(f"sqlite:///{path}", "sqlite", read_only=True)
+        monkeypatch.setattr(
+            users,
+            "AsyncReadSessionLocal",
+            async_sessionmaker(async_replica, autoflush=False, expire_on_commit=False),
+        )
+        return async_replica
+
+    yield snapshot
+    replica.recent_writes.clear()
+
+
+def test_reads_use_replica_once_sticky_window_passes(replica_db, monkeypatch):
+    token = get_token()
+    doc_id = client.post("/documents/", params={"token": token, "text": "v1"}).json()["id"]
+    replica_db()
+    client.put(f"/documents/{doc_id}", params={"token": token}, json={"text": "v2"})
+
+    # Just wrote: the read sticks to the primary.
+    assert client.get(f"/documents/{doc_id}", params={"token": token}).json()["text"] == "v2"
+
+    # Outside the window the stale replica answers.
+    monkeypatch.setenv("DB_REPLICA_STICKY_SECONDS", "0")
+    assert client.get(f"/documents/{doc_id}", params={"token": token}).json()["text"] == "v1"
+    revs = client.get(f"/documents/{doc_id}/revisions", params={"token": token}).json()
+    assert revs == []
+
+
+def test_stickiness_is_per_token(replica_db, monkeypatch):
+    # Bypass the settings cache so the reads show which database answered.
+    monkeypatch.setattr(settings_service, "cache", settings_service.SettingsCache(0, 0))
+    writer, reader = get_token(), get_token()
+    key = f"theme_{uuid.uuid4().hex[:6]}"
+    setting = {"key": key, "value": "light", "user_based": False}
+    client.post("/settings/", params={"token": writer}, json=setting)
+    replica_db()
+    client.post("/settings/", params={"token": writer}, json=dict(setting, value="dark"))
+
+    assert client.get(f"/settings/{key}", params={"token": writer}).json()["value"] == "dark"
+    assert client.get(f"/settings/{key}", params={"token": reader}).json()["value"] == "light"
+
+
+def test_sync_writes_make_reads_sticky(replica_db):
+    token = get_token()
+    replica.recent_writes.clear()
+    assert not replica.use_primary(token)
+    resp = client.put("/auth/me", params={"token": token}, json={"first_name": "Flynn"})
+    assert resp.status_code == 200
+    assert replica.use_primary(token)
+
+
+def test_replica_engine_is_read_only(replica_db):
+    async_replica = replica_db()
+
+    async def write():
+        async with async_replica.begin() as conn:
+            await conn.execute(text("DELETE FROM settings"))
+
+    with pytest.raises(Exception, match="readonly"):
+        asyncio.run(write())
+
+
+def test_without_replica_reads_use_primary():
+    if not db.DATABASE_REPLICA_URL:
+        assert db.AsyncReadSessionLocal is db.AsyncSessionLocal
@@ -0,0 +1,76 @@
+import sys, os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def get_token():
+    username = f"search_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def search(token, q, **params):
+    resp = client.get("/search/", params={"token": token, "q": q, **params})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_search_tracks_document_changes():
+    token = get_token()
+    word = f"zebra{uuid.uuid4().hex[:6]}"
+    doc_id = client.post(
+        "/documents/", params={"token": token, "text": f"the {word} crossed", "label": "Intro"}
+    ).json()["id"]
+
+    hits = search(token, word)
+    assert [(h["kind"], h["id"]) for h in hits] == [("document", doc_id)]
+    assert f"<b>{word}</b>" in hits[0]["snippet"]
+    assert search(token, word[:-2])[0]["id"] == doc_id
+
+    client.put(f"/documents/{doc_id}", params={"token": token}, json={"text": "nothing here"})
+    assert search(token, word) == []
+    client.put(f"/documents/{doc_id}", params={"token": token}, json={"notes": f"{word} in notes"})
+    assert search(token, word)[0]["id"] == doc_id
+
+    client.delete(f"/documents/{doc_id}", params={"token": token})
+    assert search(token, word) == []
+
+
+def test_search_ranks_titles_and_scopes_results():
+    token = get_token()
+    word = f"okapi{uuid.uuid4().hex[:6]}"
+    p1 = client.post("/projects/", params={"token": token}, json={"label": "P1"}).json()["id"]
+    p2 = client.post("/projects/", params={"token": token}, json={"label": "P2"}).json()["id"]
+    body_doc = client.post(
+        "/documents/", params={"token": token, "project_id": p1, "text": f"about the {word}"}
+    ).json()["id"]
+    title_doc = client.post(
+        "/documents/", params={"token": token, "project_id": p2, "label": word, "text": "x"}
+    ).json()["id"]
+    ref_id = client.post(
+        "/references/",
+        params={"token": token},
+        data={"project_id": p2, "query": f"{word} study"},
+    ).json()["id"]
+
+    hits = search(token, word)
+    assert (hits[-1]["kind"], hits[-1]["id"]) == ("document", body_doc)
+    assert {(h["kind"], h["id"]) for h in hits} == {
+        ("document", body_doc),
+        ("document", title_doc),
+        ("reference", ref_id),
+    }
+    assert [h["id"] for h in search(token, word, project_id=p1)] == [body_doc]
+    assert search(get_token(), word) == []
+
+
+def test_search_treats_input_as_plain_terms():
+    token = get_token()
+    assert search(token, 'AND "( NEAR') == []
+    assert search(token, "   ") == []
@@ -0,0 +1,79 @@
+import sys, os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from backend.db import async_engine
+from backend.main import app
+from backend.services import settings as settings_service
+
+client = TestClient(app)
+
+
+def get_token():
+    username = f"settings_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    return resp.json()["access_token"]
+
+
+def put(token, key, value, user_based=True):
+    return client.post(
+        "/settings/", params={"token": token}, json={"key": key, "value": value, "user_based": user_based}
+    )
+
+
+def test_bulk_resolution_merges_user_over_global():
+    token = get_token()
+    prefix = uuid.uuid4().hex[:6]
+    put(token, f"{prefix}.theme", "light", user_based=False)
+    put(token, f"{prefix}.font", "serif", user_based=False)
+    put(token, f"{prefix}.theme", "dark")
+
+    keys = [f"{prefix}.theme", f"{prefix}.font", f"{prefix}.missing"]
+    resp = client.get("/settings/", params={"token": token, "keys": keys})
+    assert resp.status_code == 200
+    values = {s["key"]: (s["value"], s["user_id"] is not None) for s in resp.json()}
+    assert values == {f"{prefix}.theme": ("dark", True), f"{prefix}.font": ("serif", False)}
+
+    everything = client.get("/settings/", params={"token": token}).json()
+    assert {s["key"] for s in everything} >= {f"{prefix}.theme", f"{prefix}.font"}
+
+    anonymous = client.get("/settings/", params={"keys": keys}).json()
+    assert {s["key"]: s["value"] for s in anonymous}[f"{prefix}.theme"] == "light"
+
+
+def test_cached_reads_issue_no_queries_and_see_writes():
+    token = get_token()
+    key = f"lang_{uuid.uuid4().hex[:6]}"
+    put(token, key, "en")
+    assert client.get(f"/settings/{key}", params={"token": token}).json()["value"] == "en"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(3):
+            assert client.get(f"/settings/{key}", params={"token": token}).json()["value"] == "en"
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    assert statements == []
+
+    put(token, key, "de")
+    assert client.get(f"/settings/{key}", params={"token": token}).json()["value"] == "de"
+
+
+def test_stale_fill_is_discarded_after_a_write():
+    cache = settings_service.SettingsCache(max_users=1, ttl=60)
+    generation = cache.generation()
+    cache.store({"id": 1, "key": "k", "value": "new", "user_id": None})
+    cache.fill(None, {"k": {"id": 1, "key": "k", "value": "old", "user_id": None}}, generation)
+    assert cache.layer(None) is None
+
+    cache.fill(None, {}, cache.generation())
+    cache.fill(1, {}, cache.generation())
+    cache.fill(2, {}, cache.generation())
+    assert cache.layer(1) is None
+    assert cache.layer(2) == {} and cache.layer(None) == {}
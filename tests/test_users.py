@@ -1,9 +1,18 @@
 import sys, os
+import asyncio
+import threading
+import time
 import uuid
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+import pytest
 from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import event
 from backend.main import app
+from backend import models
+from backend.db import SessionLocal, engine
+from backend.services import auth, principals
 
 client = TestClient(app)
 
@@ -43,3 +52,137 @@ def test_register_login_and_update():
 
     logout_resp = client.post("/auth/logout")
     assert logout_resp.status_code == 200
+
+
+def test_principal_cache_skips_token_decode_and_lookup(monkeypatch):
+    username = f"carol_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    token = client.post(
+        "/auth/login", json={"username": username, "password": "secret"}
+    ).json()["access_token"]
+    assert client.get("/auth/me", params={"token": token}).status_code == 200
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    monkeypatch.setattr(auth, "decode_access_token", lambda t: pytest.fail("token decoded"))
+    try:
+        me = client.get("/auth/me", params={"token": token})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        monkeypatch.undo()
+    assert me.json()["username"] == username
+    assert statements == []
+
+    client.put("/auth/me", params={"token": token}, json={"first_name": "Caro"})
+    assert client.get("/auth/me", params={"token": token}).json()["first_name"] == "Caro"
+
+
+def test_principal_cache_bounds_and_expiry():
+    cache = principals.PrincipalCache(max_size=2, ttl=60)
+    now = time.time()
+    cache.put("a", {"id": 1}, now + 60)
+    cache.put("b", {"id": 2}, now + 60)
+    cache.get("a")
+    cache.put("c", {"id": 1}, now + 60)
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    cache.invalidate_user(1)
+    assert cache.get("a") is None and cache.get("c") is None
+
+    cache.put("expired", {"id": 3}, now - 1)
+    assert cache.get("expired") is None
+
+
+def test_hashing_executor_rejects_when_queue_full():
+    executor = auth.HashingExecutor(workers=1, queue_size=0)
+    release = threading.Event()
+    worker = threading.Thread(target=executor.run, args=(release.wait,))
+    worker.start()
+    while executor.metrics()["in_flight"] == 0:
+        time.sleep(0.01)
+    with pytest.raises(auth.HashingOverloaded):
+        executor.run(lambda: None)
+    release.set()
+    worker.join()
+    metrics = executor.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 1
+    assert metrics["in_flight"] == 0
+
+
+def test_hashing_executor_run_async_waits_without_a_thread():
+    executor = auth.HashingExecutor(workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(executor.run_async(release.wait))
+        second = asyncio.ensure_future(executor.run_async(lambda: "done"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(auth.HashingOverloaded):
+            await executor.run_async(lambda: None)
+        release.set()
+        return await first, await second
+
+    assert asyncio.run(main()) == (True, "done")
+    metrics = executor.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 2
+    assert metrics["in_flight"] == 0
+
+
+def test_login_sheds_load_with_503(monkeypatch):
+    def overloaded(*args):
+        raise auth.HashingOverloaded()
+
+    async def overloaded_async(*args):
+        raise auth.HashingOverloaded()
+
+    monkeypatch.setattr(auth.hashing, "run", overloaded)
+    monkeypatch.setattr(auth.hashing, "run_async", overloaded_async)
+    resp = client.post("/auth/login", json={"username": "nobody", "password": "x"})
+    # unknown users never reach the hasher
+    assert resp.status_code == 401
+    resp = client.post("/auth/register", json={"username": f"x_{uuid.uuid4().hex[:6]}", "password": "x"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+
+
+def test_hashing_metrics_are_admin_only(monkeypatch):
+    admin = f"admin_{uuid.uuid4().hex[:6]}"
+    monkeypatch.setenv("ADMIN_USERNAME", admin)
+    tokens = {}
+    for username in (admin, f"eve_{uuid.uuid4().hex[:6]}"):
+        client.post("/auth/register", json={"username": username, "password": "secret"})
+        tokens[username] = client.post(
+            "/auth/login", json={"username": username, "password": "secret"}
+        ).json()["access_token"]
+
+    assert client.get("/auth/hashing/metrics").status_code == 422
+    metrics = [client.get("/auth/hashing/metrics", params={"token": t}) for t in tokens.values()]
+    assert [r.status_code for r in metrics] == [200, 403]
+    assert "rejected" in metrics[0].json()
+
+
+def test_login_rehashes_when_cost_changes(monkeypatch):
+    username = f"dave_{uuid.uuid4().hex[:6]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    token = client.post("/auth/login", json={"username": username, "password": "secret"}).json()["access_token"]
+    assert client.get("/auth/me", params={"token": token}).status_code == 200
+    assert principals.cached_user(token) is not None
+    monkeypatch.setattr(
+        auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+    )
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    assert resp.status_code == 200
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == username).one()
+        assert user.password_hash.startswith("$2b$05$")
+    finally:
+        db.close()
+    # the cached principal still held the old hash
+    assert principals.cached_user(token) is None
+    resp = client.post("/auth/login", json={"username": username, "password": "secret"})
+    assert resp.status_code == 200